@@ -1,133 +1,217 @@
 """The Energa Mobile integration v3.5.6."""
-import asyncio
-from datetime import timedelta, datetime
+from datetime import datetime, time, timedelta
 import logging
-from zoneinfo import ZoneInfo
 
 import voluptuous as vol
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant, ServiceCall
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from homeassistant.helpers import entity_registry as er
+from homeassistant.core import HomeAssistant, ServiceCall, callback
 from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady
-from homeassistant.components.recorder.statistics import async_import_statistics
-from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.helpers.importlib import async_import_module
 
+from .aggregates import EnergaAggregates
 from .api import EnergaAPI, EnergaAuthError, EnergaConnectionError
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD
+from .cache import EnergaChartCache, EnergaMeterStore
+from .const import (
+    DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_EXTERNAL_STATISTICS, CONF_TARIFF, CONF_PRICE_PEAK, CONF_PRICE_OFFPEAK,
+    DATA_CHART_CACHE, DATA_JOBS, DEFAULT_HISTORY_WORKERS, ATTR_CONFIG_ENTRY, ATTR_METER_POINT_ID,
+)
+from .jobs import EnergaJobManager
+from .session import async_create_session
+from .tariffs import tariff_pricing
 
 _LOGGER = logging.getLogger(__name__)
 PLATFORMS = ["sensor"]
+# Opcje, których zmiana wymaga przeładowania (feed live pisze do innych statystyk albo liczy inne koszty)
+RELOAD_OPTIONS = (CONF_EXTERNAL_STATISTICS, CONF_TARIFF, CONF_PRICE_PEAK, CONF_PRICE_OFFPEAK)
+JOB_SERVICES = {"pause_history": "async_pause", "resume_history": "async_resume", "cancel_history": "async_cancel"}
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    session = async_get_clientsession(hass)
-    api = EnergaAPI(entry.data[CONF_USERNAME], entry.data[CONF_PASSWORD], session)
-
-    try: await api.async_login()
-    except EnergaAuthError as err: raise ConfigEntryAuthFailed(err) from err
-    except EnergaConnectionError as err: raise ConfigEntryNotReady(err) from err
+    # Jeden cache wykresów na całą domenę (klucze zawierają meter_point_id), wczytywany w tle
+    if (cache := hass.data.get(DATA_CHART_CACHE)) is None:
+        cache = hass.data[DATA_CHART_CACHE] = EnergaChartCache(hass)
+        hass.async_create_background_task(cache.async_load(), "energa_mobile chart cache")
+
+    meter_store = EnergaMeterStore(hass, entry.entry_id)
+    cached_meters = await meter_store.async_load()
+    aggregates = EnergaAggregates(hass, entry.entry_id)
+    await aggregates.async_load()
+
+    @callback
+    def _meters_fetched(meters):
+        meter_store.async_set(meters)
+        # Inna lista liczników niż w pamięci - encje trzeba utworzyć od nowa
+        if cached_meters and {m["meter_point_id"] for m in meters} != {m["meter_point_id"] for m in cached_meters}:
+            _LOGGER.info("Energa: zmieniła się lista liczników, przeładowanie integracji")
+            hass.async_create_task(hass.config_entries.async_reload(entry.entry_id))
+
+    # Własna sesja konta (token, ciasteczka) na wspólnym connectorze domeny
+    session = async_create_session(hass)
+    entry.async_on_unload(session.close)
+    api = EnergaAPI(entry.data[CONF_USERNAME], entry.data[CONF_PASSWORD], session, cache, on_meters=_meters_fetched, aggregates=aggregates)
+
+    # Znane liczniki: start bez sieci, logowanie i odświeżenie w tle (błąd logowania -> reauth z koordynatora)
+    if cached_meters: api.seed_meters(cached_meters)
+    else:
+        try: await api.async_login()
+        except EnergaAuthError as err: raise ConfigEntryAuthFailed(err) from err
+        except EnergaConnectionError as err: raise ConfigEntryNotReady(err) from err
 
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = api
+    # Import i naprawa historii przez kolejkę konta (przed platformami - sensor postępu jej potrzebuje)
+    jobs = hass.data.setdefault(DATA_JOBS, {})[entry.entry_id] = EnergaJobManager(hass, entry.entry_id)
+    entry.async_on_unload(jobs.async_cancel)
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    reload_options = {key: entry.options.get(key) for key in RELOAD_OPTIONS}
+
+    # Zmiana trybu statystyk albo taryfy w opcjach - przeładowanie
+    async def _async_options_updated(hass: HomeAssistant, entry: ConfigEntry):
+        if {key: entry.options.get(key) for key in RELOAD_OPTIONS} != reload_options: await hass.config_entries.async_reload(entry.entry_id)
+
+    entry.async_on_unload(entry.add_update_listener(_async_options_updated))
+
+    _async_register_services(hass)
+    return True
+
+def _async_register_services(hass: HomeAssistant):
+    """Serwisy domeny - konto (api, kolejka, opcje) odczytujemy przy każdym wywołaniu, bo przeładowanie podmienia sesję."""
+    if hass.services.has_service(DOMAIN, "fetch_history"): return
 
     async def import_history_service(call: ServiceCall):
-        start_date_str = call.data["start_date"]
-        days = call.data.get("days", 30)
-        try:
-            start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
+        try: start_date = datetime.strptime(call.data["start_date"], "%Y-%m-%d")
+        except ValueError:
+            _LOGGER.error("Błędny format daty.")
+            return
+        for entry, api, _jobs in _service_entries(hass, call):
+            for meter in await api.async_get_data():
+                await async_submit_import(hass, entry, meter["meter_point_id"], start_date, call.data["days"], call.data["workers"], call.data["range_mode"])
+
+    async def repair_history_service(call: ServiceCall):
+        try: start_date = datetime.strptime(call.data["start_date"], "%Y-%m-%d")
+        except ValueError:
+            _LOGGER.error("Błędny format daty.")
+            return
+        for entry, api, jobs in _service_entries(hass, call):
+            for meter in await api.async_get_data():
+                await _async_submit_repair(hass, entry, api, jobs, meter["meter_point_id"], start_date, call.data["days"], call.data["workers"])
+
+    async def import_file_service(call: ServiceCall):
+        path = call.data["path"]
+        if not hass.config.is_allowed_path(path):
+            _LOGGER.error(f"Energa: ścieżka {path} nie jest dozwolona (allowlist_external_dirs).")
+            return
+        transfer = await async_import_module(hass, f"{__package__}.transfer")
+        try: ranges = await transfer.async_file_ranges(hass, path)
+        except OSError as err:
+            _LOGGER.error(f"Energa: nie można odczytać {path}: {err}")
+            return
+        for entry, api, jobs in _service_entries(hass, call):
             meters = await api.async_get_data()
+            # Rekordy bez meter_point_id przypisujemy tylko, gdy konto ma jeden licznik
+            unassigned = len(meters) == 1 and "" in ranges
             for meter in meters:
-                hass.async_create_task(run_history_import(hass, api, meter["meter_point_id"], start_date, days))
-        except ValueError: _LOGGER.error("Błędny format daty.")
-
-    if not hass.services.has_service(DOMAIN, "fetch_history"):
-        hass.services.async_register(DOMAIN, "fetch_history", import_history_service, schema=vol.Schema({
-            vol.Required("start_date"): str,
-            vol.Optional("days", default=30): int
-        }))
-    return True
-
-async def run_history_import(hass, api, meter_id, start_date, days):
-    _LOGGER.info(f"Energa [{meter_id}]: Start importu v3.5.4 (Final Logic Fix).")
-    ent_reg = er.async_get(hass)
-
-    # Celujemy w sensory v2 (te czyste)
-    uid_imp = f"energa_import_total_{meter_id}"
-    uid_exp = f"energa_export_total_{meter_id}"
-
-    entity_id_imp = ent_reg.async_get_entity_id("sensor", DOMAIN, uid_imp)
-    entity_id_exp = ent_reg.async_get_entity_id("sensor", DOMAIN, uid_exp)
-
-    if not entity_id_imp:
-        entity_id_imp = f"sensor.energa_import_total_{meter_id}"
-    if not entity_id_exp:
-        entity_id_exp = f"sensor.energa_export_total_{meter_id}"
-
-    tz = ZoneInfo("Europe/Warsaw")
-
-    current_sum_imp = 0.0
-    current_sum_exp = 0.0
-
-    for i in range(days):
-        target_day = start_date + timedelta(days=i)
-        if target_day.date() >= datetime.now().date(): break
-        try:
-            await asyncio.sleep(1.0)
-            data = await api.async_get_history_hourly(meter_id, target_day)
-
-            stats_imp = []
-            stats_exp = []
-            day_start = datetime(target_day.year, target_day.month, target_day.day, 0, 0, 0, tzinfo=tz)
-
-            # Start dnia: state = sum (z poprzedniego dnia)
-            stats_imp.append(StatisticData(start=day_start, state=current_sum_imp, sum=current_sum_imp))
-            stats_exp.append(StatisticData(start=day_start, state=current_sum_exp, sum=current_sum_exp))
-
-            # Agregacja godzinowa
-            for h, val in enumerate(data.get("import", [])):
-                if val >= 0:
-                    current_sum_imp += val
-                    dt_hour = day_start + timedelta(hours=h+1)
-                    stats_imp.append(StatisticData(start=dt_hour, state=current_sum_imp, sum=current_sum_imp))
-
-            for h, val in enumerate(data.get("export", [])):
-                if val >= 0:
-                    current_sum_exp += val
-                    dt_hour = day_start + timedelta(hours=h+1)
-                    stats_exp.append(StatisticData(start=dt_hour, state=current_sum_exp, sum=current_sum_exp))
-
-            # ZAPIS DO BAZY
-            if stats_imp:
-                async_import_statistics(hass, StatisticMetaData(
-                    has_mean=False, has_sum=True, name=None, source='recorder', statistic_id=entity_id_imp,
-                    unit_of_measurement="kWh", unit_class="energy"
-                ), stats_imp)
-
-                # FIX: Aktualizujemy stan sensora LIVE TYLKO RAZ NA KONIEC DNIA.
-                hass.states.async_set(
-                    entity_id_imp,
-                    current_sum_imp,
-                    {"unit_of_measurement": "kWh", "device_class": "energy", "state_class": "total_increasing"}
-                )
-
-            if stats_exp:
-                async_import_statistics(hass, StatisticMetaData(
-                    has_mean=False, has_sum=True, name=None, source='recorder', statistic_id=entity_id_exp,
-                    unit_of_measurement="kWh", unit_class="energy"
-                ), stats_exp)
-
-                # FIX: Aktualizujemy stan sensora LIVE TYLKO RAZ NA KONIEC DNIA.
-                hass.states.async_set(
-                    entity_id_exp,
-                    current_sum_exp,
-                    {"unit_of_measurement": "kWh", "device_class": "energy", "state_class": "total_increasing"}
-                )
-
-        except Exception as e: _LOGGER.error(f"Energa Import Error: {e}")
-    _LOGGER.info(f"Energa [{meter_id}]: Zakończono import.")
+                if (meter_range := ranges.get(str(meter["meter_point_id"])) or (ranges.get("") if unassigned else None)) is None: continue
+                _async_submit_file_import(hass, entry, jobs, transfer, meter, path, meter_range, unassigned)
+
+    async def export_history_service(call: ServiceCall):
+        path = call.data["path"]
+        if not hass.config.is_allowed_path(path):
+            _LOGGER.error(f"Energa: ścieżka {path} nie jest dozwolona (allowlist_external_dirs).")
+            return
+        transfer = await async_import_module(hass, f"{__package__}.transfer")
+        try: start_date = datetime.strptime(call.data["start_date"], "%Y-%m-%d").date()
+        except ValueError:
+            _LOGGER.error("Błędny format daty.")
+            return
+        # Jeden plik - konta eksportujemy po kolei w jednym zadaniu
+        accounts = [(api, [m["meter_point_id"] for m in await api.async_get_data()]) for _entry, api, _jobs in _service_entries(hass, call)]
+        if not accounts: return
+        hass.async_create_background_task(
+            transfer.run_file_export(hass, accounts, path, start_date, start_date + timedelta(days=call.data["days"] - 1)),
+            f"energa_mobile export {path}",
+        )
+
+    # Pauza / wznowienie / anulowanie: wskazane konto i/lub licznik, domyślnie wszystkie
+    async def jobs_service(call: ServiceCall):
+        for _entry, _api, jobs in _service_entries(hass, call):
+            getattr(jobs, JOB_SERVICES[call.service])(call.data.get(ATTR_METER_POINT_ID))
+
+    entry_field = {vol.Optional(ATTR_CONFIG_ENTRY): str}
+    hass.services.async_register(DOMAIN, "fetch_history", import_history_service, schema=vol.Schema({
+        **entry_field,
+        vol.Required("start_date"): str,
+        vol.Optional("days", default=30): int,
+        vol.Optional("workers", default=DEFAULT_HISTORY_WORKERS): vol.All(int, vol.Range(min=1, max=10)),
+        vol.Optional("range_mode", default=False): bool
+    }))
+    hass.services.async_register(DOMAIN, "repair_history", repair_history_service, schema=vol.Schema({
+        **entry_field,
+        vol.Required("start_date"): str,
+        vol.Optional("days", default=30): int,
+        vol.Optional("workers", default=DEFAULT_HISTORY_WORKERS): vol.All(int, vol.Range(min=1, max=10))
+    }))
+    hass.services.async_register(DOMAIN, "import_history_file", import_file_service, schema=vol.Schema({**entry_field, vol.Required("path"): str}))
+    hass.services.async_register(DOMAIN, "export_history", export_history_service, schema=vol.Schema({
+        **entry_field,
+        vol.Required("path"): str,
+        vol.Required("start_date"): str,
+        vol.Optional("days", default=30): int
+    }))
+    for service in JOB_SERVICES: hass.services.async_register(DOMAIN, service, jobs_service, schema=vol.Schema({
+        **entry_field,
+        vol.Optional(ATTR_METER_POINT_ID): vol.Coerce(str),
+    }))
+
+def _service_entries(hass, call):
+    """[(entry, api, kolejka)] kont, których dotyczy wywołanie: wskazane w `config_entry` albo wszystkie załadowane."""
+    apis = hass.data.get(DOMAIN, {})
+    entry_ids = [call.data[ATTR_CONFIG_ENTRY]] if call.data.get(ATTR_CONFIG_ENTRY) else list(apis)
+    result = []
+    for entry_id in entry_ids:
+        if entry_id not in apis or (entry := hass.config_entries.async_get_entry(entry_id)) is None:
+            _LOGGER.error(f"Energa: konto {entry_id} nie jest załadowane.")
+            continue
+        result.append((entry, apis[entry_id], hass.data[DATA_JOBS][entry_id]))
+    return result
+
+async def _async_submit_repair(hass, entry, api, jobs, meter_id, start_date, days, workers):
+    # Moduł historii (statystyki recordera) ładujemy dopiero przy pierwszym użyciu
+    history = await async_import_module(hass, f"{__package__}.history")
+    external = entry.options.get(CONF_EXTERNAL_STATISTICS, False)
+    return jobs.async_submit(
+        "repair", meter_id, start_date.date(), start_date.date() + timedelta(days=days - 1),
+        lambda job: history.run_statistics_repair(hass, api, job.meter_id, datetime.combine(job.first_day, time()), job.days, workers, external, job),
+    )
+
+def _async_submit_file_import(hass, entry, jobs, transfer, meter, path, meter_range, unassigned):
+    external = entry.options.get(CONF_EXTERNAL_STATISTICS, False)
+    pricing = tariff_pricing(entry.options, meter.get("tariff"))
+    return jobs.async_submit(
+        "file", meter["meter_point_id"], *meter_range,
+        lambda job: transfer.run_file_import(hass, job.meter_id, path, job.first_day, job.last_day, external, job, unassigned, pricing),
+    )
+
+async def async_submit_import(hass, entry, meter_id, start_date, days, workers=DEFAULT_HISTORY_WORKERS, range_mode=False):
+    """Import historii licznika przez kolejkę konta (serwis i options flow)."""
+    history = await async_import_module(hass, f"{__package__}.history")
+    api = hass.data[DOMAIN][entry.entry_id]
+    external = entry.options.get(CONF_EXTERNAL_STATISTICS, False)
+    # Koszty wg taryfy licznika liczone w tym samym przebiegu (gdy ceny są ustawione w opcjach)
+    meter = next((m for m in api._meters_data if m["meter_point_id"] == meter_id), {})
+    pricing = tariff_pricing(entry.options, meter.get("tariff"))
+    return hass.data[DATA_JOBS][entry.entry_id].async_submit(
+        "import", meter_id, start_date.date(), start_date.date() + timedelta(days=days - 1),
+        lambda job: history.run_history_import(
+            hass, api, job.meter_id, datetime.combine(job.first_day, time()), job.days, workers, range_mode, external, job, pricing
+        ),
+    )
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    await EnergaMeterStore(hass, entry.entry_id).async_remove()
+    await EnergaAggregates(hass, entry.entry_id).async_remove()
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
         hass.data[DOMAIN].pop(entry.entry_id)
+        hass.data[DATA_JOBS].pop(entry.entry_id, None)
     return unload_ok
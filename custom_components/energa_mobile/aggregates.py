@@ -0,0 +1,113 @@
+"""Hourly, daily, weekly and monthly buckets derived from the hourly vectors the API client already fetched."""
+from datetime import datetime, timedelta
+import logging
+
+from homeassistant.helpers.storage import Store
+
+from .day_calendar import TZ, local_day, today
+from .const import (
+    AGGREGATES_STORE_KEY, AGGREGATES_STORE_VERSION, AGGREGATES_SAVE_DELAY, AGGREGATES_RETENTION_DAYS, AGGREGATES_HOURS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+PERIODS = ("hour", "day", "week", "month")
+
+def week_key(day):
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def period_start(period, day):
+    """Pierwszy dzień okresu zawierającego `day`."""
+    if period == "week": return day - timedelta(days=day.weekday())
+    if period == "month": return day.replace(day=1)
+    return day
+
+class EnergaAggregates:
+    """Sumy per licznik i rejestr: godziny (ostatnie AGGREGATES_HOURS), dni, tygodnie ISO i miesiące.
+
+    Dzień trzyma swoją ostatnią sumę - kolejny wektor tego samego dnia dokłada do tygodnia i miesiąca tylko różnicę.
+    """
+
+    def __init__(self, hass, entry_id):
+        self._store = Store(hass, AGGREGATES_STORE_VERSION, f"{AGGREGATES_STORE_KEY}.{entry_id}")
+        self._data = {}
+
+    async def async_load(self):
+        self._data = (await self._store.async_load() or {}).get("meters", {})
+
+    async def async_remove(self):
+        await self._store.async_remove()
+
+    def _buckets(self, meter_id, kind):
+        meter = self._data.setdefault(str(meter_id), {})
+        return meter.setdefault(kind, {"hours": {}, "days": {}, "weeks": {}, "months": {}})
+
+    def observe(self, meter_id, kind, day, vals):
+        """Wektor godzinowy dnia (dzisiejszy z odświeżania, historyczny z importu/eksportu albo cache)."""
+        current = today()
+        if day < current - timedelta(days=AGGREGATES_RETENTION_DAYS) or day > current: return
+        b = self._buckets(meter_id, kind)
+        changed = False
+        if day >= current - timedelta(days=AGGREGATES_HOURS // 24):
+            slots = local_day(day).slots
+            for start, v in zip(slots, vals):
+                key = str(int(start))
+                if b["hours"].get(key) != v: b["hours"][key], changed = v, True
+
+        total = sum(vals)
+        key = day.isoformat()
+        delta = total - b["days"].get(key, 0.0)
+        if key not in b["days"] or abs(delta) > 1e-9:
+            b["days"][key] = total
+            for bucket, bkey in (("weeks", week_key(day)), ("months", key[:7])):
+                b[bucket][bkey] = b[bucket].get(bkey, 0.0) + delta
+            changed = True
+        if changed:
+            self._prune(b, current)
+            self._store.async_delay_save(lambda: {"meters": self._data}, AGGREGATES_SAVE_DELAY)
+
+    @staticmethod
+    def _prune(b, current):
+        oldest = current - timedelta(days=AGGREGATES_RETENTION_DAYS)
+        oldest_hour = local_day(current).slots[0] - AGGREGATES_HOURS * 3600
+        for key in [k for k in b["hours"] if int(k) < oldest_hour]: del b["hours"][key]
+        for key in [k for k in b["days"] if k < oldest.isoformat()]: del b["days"][key]
+        for key in [k for k in b["weeks"] if k < week_key(oldest)]: del b["weeks"][key]
+        for key in [k for k in b["months"] if k < oldest.isoformat()[:7]]: del b["months"][key]
+
+    def missing_days(self, meter_id, kind, first, last):
+        """Dni z [first, last] bez sumy dnia - ich brak zaniża tydzień i miesiąc (np. HA wyłączony, świeża instalacja)."""
+        days = self._data.get(str(meter_id), {}).get(kind, {}).get("days", {})
+        return [d for d in (first + timedelta(days=i) for i in range((last - first).days + 1)) if d.isoformat() not in days]
+
+    def complete(self, meter_id, kind, period):
+        """Czy suma tygodnia / miesiąca obejmuje wszystkie zamknięte dni okresu (False - brakujące dni spoza cache)."""
+        current = today()
+        return not self.missing_days(meter_id, kind, period_start(period, current), current - timedelta(days=1))
+
+    def value(self, meter_id, kind, period):
+        """Bieżąca wartość okresu: ostatnia opublikowana godzina albo suma dnia / tygodnia / miesiąca."""
+        b = self._data.get(str(meter_id), {}).get(kind)
+        if not b: return None
+        current = today()
+        if period == "hour":
+            if not b["hours"]: return None
+            return b["hours"][max(b["hours"], key=int)]
+        if period == "day": return b["days"].get(current.isoformat())
+        if period == "week": return b["weeks"].get(week_key(current))
+        return b["months"].get(current.isoformat()[:7])
+
+    def last_hour_start(self, meter_id, kind):
+        b = self._data.get(str(meter_id), {}).get(kind)
+        if not b or not b["hours"]: return None
+        return datetime.fromtimestamp(int(max(b["hours"], key=int)), TZ)
+
+    def history(self, meter_id, kind, period, count):
+        """Ostatnie `count` kubełków okresu (atrybuty sensorów): {klucz: kWh}."""
+        b = self._data.get(str(meter_id), {}).get(kind)
+        if not b: return {}
+        if period == "hour":
+            keys = sorted(b["hours"], key=int)[-count:]
+            return {datetime.fromtimestamp(int(k), TZ).isoformat(): b["hours"][k] for k in keys}
+        bucket = b[f"{period}s"]
+        return {k: round(bucket[k], 3) for k in sorted(bucket)[-count:]}
@@ -1,9 +1,19 @@
 """API Client for Energa Mobile v3.5.6."""
+from array import array
+import asyncio
 import logging
+from math import isnan
+import time
 import aiohttp
-from datetime import datetime
-from zoneinfo import ZoneInfo
-from .const import BASE_URL, LOGIN_ENDPOINT, SESSION_ENDPOINT, DATA_ENDPOINT, CHART_ENDPOINT, HEADERS
+from datetime import datetime, timedelta
+from .day_calendar import TZ, day_of, local_day, today
+from .decode import chart_values, json_loads, month_values
+from .limiter import get_rate_limiter
+from .metrics import EnergaMetrics
+from .const import (
+    BASE_URL, LOGIN_ENDPOINT, SESSION_ENDPOINT, DATA_ENDPOINT, CHART_ENDPOINT, HEADERS, DEFAULT_CHART_CONCURRENCY,
+    TOKEN_REFRESH_AFTER, RANGE_VERIFY_TOLERANCE,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -12,66 +22,191 @@ class EnergaConnectionError(Exception): pass
 class EnergaTokenExpiredError(Exception): pass # <--- NOWY WYJĄTEK
 
 class EnergaAPI:
-    def __init__(self, username, password, session: aiohttp.ClientSession):
+    def __init__(self, username, password, session: aiohttp.ClientSession, cache=None, max_concurrency=DEFAULT_CHART_CONCURRENCY, base_url=BASE_URL, on_meters=None, aggregates=None):
         self._username = username
         self._password = password
         self._session = session
+        self._base_url = base_url
+        self._cache = cache
+        self._max_concurrency = max(1, int(max_concurrency))
+        self._limiter = get_rate_limiter(username)
         self._token = None
+        self._login_time = None
+        self._login_gen = 0
+        self._login_lock = asyncio.Lock()
+        self._session_ready = False
         self._meters_data = []
+        self._meters_fresh = False
+        self._on_meters = on_meters
+        self._inflight = {}
+        self.metrics = EnergaMetrics()
+        # Agregaty godzin/dni/tygodni/miesięcy liczone z pobranych już wektorów
+        self.aggregates = aggregates
 
     async def async_login(self):
+        """Zapewnia ważną sesję - jeśli token jest świeży, nie robi żadnego zapytania."""
+        await self._async_ensure_login()
+        return True
+
+    async def _async_ensure_login(self):
+        gen = self._login_gen
+        if self._login_time is None or time.monotonic() - self._login_time > TOKEN_REFRESH_AFTER:
+            await self._async_relogin(gen)
+
+    async def _async_relogin(self, gen):
+        """Loguje ponownie pod lockiem; wołający z nieaktualnym `gen` czekają na jeden wspólny login."""
+        async with self._login_lock:
+            if gen != self._login_gen and self._login_time is not None: return
+            await self._async_do_login()
+            if self._login_gen > 0: self.metrics.relogins += 1
+            self._login_time = time.monotonic()
+            self._login_gen += 1
+
+    async def _async_do_login(self):
         try:
-            await self._api_get(SESSION_ENDPOINT)
+            # SessionStatus tylko przy pierwszym logowaniu (ustawia ciasteczka sesji)
+            if not self._session_ready:
+                await self._request(SESSION_ENDPOINT)
+                self._session_ready = True
             params = {"clientOS": "ios", "notifyService": "APNs", "username": self._username, "password": self._password}
-            async with self._session.get(f"{BASE_URL}{LOGIN_ENDPOINT}", headers=HEADERS, params=params, ssl=False) as resp:
+            await self._limiter.acquire()
+            started = time.monotonic()
+            async with self._session.get(f"{self._base_url}{LOGIN_ENDPOINT}", headers=HEADERS, params=params) as resp:
+                self._limiter.on_response(resp.status, time.monotonic() - started)
+                self.metrics.record(LOGIN_ENDPOINT, time.monotonic() - started, resp.status != 200)
                 if resp.status != 200: raise EnergaConnectionError(f"Login HTTP {resp.status}")
-                try: data = await resp.json()
-                except: raise EnergaConnectionError("Invalid JSON")
+                try: data = json_loads(await resp.read())
+                except ValueError: raise EnergaConnectionError("Invalid JSON")
                 if not data.get("success"): raise EnergaAuthError("Invalid credentials")
                 self._token = data.get("token") or (data.get("response") or {}).get("token")
                 return True
-        except aiohttp.ClientError as err: raise EnergaConnectionError from err
+        except aiohttp.ClientError as err:
+            if isinstance(err, aiohttp.ClientConnectionError): self._limiter.on_error()
+            raise EnergaConnectionError from err
+
+    def seed_meters(self, meters):
+        """Liczniki z pamięci lokalnej - encje powstają bez sieci, /resources/user/data pobierzemy przy pierwszym odświeżeniu."""
+        defaults = {"daily_pobor": 0.0, "daily_produkcja": 0.0, "total_plus": None, "total_minus": None, "chart_hours": 0}
+        self._meters_data = [{**defaults, **m} for m in meters]
+        self._meters_fresh = False
 
     async def async_get_data(self):
-        # ... reszta funkcji async_get_data pozostaje bez zmian ...
-        if not self._meters_data: self._meters_data = await self._fetch_all_meters()
-        tz = ZoneInfo("Europe/Warsaw")
-        ts = int(datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
+        if not self._meters_fresh:
+            self._meters_data = await self._fetch_all_meters()
+            self._meters_fresh = True
+            if self._on_meters: self._on_meters(self._meters_data)
+        day = today()
+        ts = local_day(day).chart_ts
 
-        updated_meters = []
-        for meter in self._meters_data:
+        # Wykresy wszystkich liczników i rejestrów pobieramy równolegle, max `max_concurrency` naraz
+        sem = asyncio.Semaphore(self._max_concurrency)
+
+        async def _chart(meter_id, obis):
+            async with sem: return await self._fetch_chart(meter_id, obis, ts)
+
+        async def _update(meter):
             m_data = meter.copy()
-            if m_data.get("obis_plus"):
-                vals = await self._fetch_chart(m_data["meter_point_id"], m_data["obis_plus"], ts)
-                m_data["daily_pobor"] = sum(vals)
-            if m_data.get("obis_minus"):
-                vals = await self._fetch_chart(m_data["meter_point_id"], m_data["obis_minus"], ts)
-                m_data["daily_produkcja"] = sum(vals)
-            updated_meters.append(m_data)
+            jobs = []
+            if m_data.get("obis_plus"): jobs.append(("pobor", "hourly_import", _chart(m_data["meter_point_id"], m_data["obis_plus"])))
+            if m_data.get("obis_minus"): jobs.append(("produkcja", "hourly_export", _chart(m_data["meter_point_id"], m_data["obis_minus"])))
+            results = await asyncio.gather(*(job for _, _, job in jobs))
+            # Wektor godzinowy zostaje w danych - koordynator dopisuje z niego statystyki
+            for (key, hourly_key, _), vals in zip(jobs, results):
+                m_data[f"daily_{key}"] = sum(vals)
+                m_data[hourly_key] = vals
+                if self.aggregates is not None: self.aggregates.observe(m_data["meter_point_id"], hourly_key[7:], day, vals)
+            m_data["chart_hours"] = max((len(vals) for vals in results), default=0)
+            return m_data
+
+        results = await asyncio.gather(*(_update(m) for m in self._meters_data), return_exceptions=True)
+
+        # Błąd jednego licznika nie blokuje pozostałych - zostawiamy jego poprzednie wartości
+        updated_meters = []
+        errors = []
+        for meter, res in zip(self._meters_data, results):
+            if isinstance(res, Exception):
+                _LOGGER.warning(f"Energa [{meter['meter_point_id']}]: błąd pobierania wykresu: {res}")
+                errors.append(res)
+                updated_meters.append(meter)
+            else: updated_meters.append(res)
+        if errors and len(errors) == len(results): raise errors[0]
         self._meters_data = updated_meters
         return updated_meters
 
-    async def async_get_history_hourly(self, meter_point_id, date: datetime):
-        # ... reszta funkcji async_get_history_hourly pozostaje bez zmian ...
-        meter = next((m for m in self._meters_data if m["meter_point_id"] == meter_point_id), None)
-        if not meter:
-            await self.async_get_data()
-            meter = next((m for m in self._meters_data if m["meter_point_id"] == meter_point_id), None)
-            if not meter: return {"import": [], "export": []}
+    async def async_get_history_hourly(self, meter_point_id, date: datetime, active=None, use_cache=True):
+        """Wektory godzinowe dnia. `active` (z async_find_active_days) pomija rejestry bez zużycia w tym dniu.
 
-        tz = ZoneInfo("Europe/Warsaw")
-        ts = int(date.replace(hour=0, minute=0, second=0, microsecond=0).astimezone(tz).timestamp() * 1000)
+        `use_cache=False` (naprawa statystyk) zawsze pyta API - pełny dzień i tak trafia potem do cache.
+        """
+        meter = await self._async_get_meter(meter_point_id)
+        if not meter: return {"import": [], "export": []}
+
+        # Północ czasu polskiego niezależnie od strefy systemu HA
+        day = local_day(day_of(date))
+        ts = day.chart_ts
 
         result = {"import": [], "export": []}
-        if meter.get("obis_plus"):
-            result["import"] = await self._fetch_chart(meter["meter_point_id"], meter["obis_plus"], ts)
-        if meter.get("obis_minus"):
-            result["export"] = await self._fetch_chart(meter["meter_point_id"], meter["obis_minus"], ts)
+        for kind, obis_key in (("import", "obis_plus"), ("export", "obis_minus")):
+            if not meter.get(obis_key): continue
+            if active is not None and day.day not in active[kind]:
+                # Tryb zakresowy: MONTH pokazał zero - dzień bez zapytania DAY
+                self.metrics.range_skipped += 1
+                result[kind] = array('d', bytes(8 * day.hours))
+                continue
+            result[kind] = await self._fetch_chart(meter["meter_point_id"], meter[obis_key], ts, use_cache=use_cache)
+            if self.aggregates is not None: self.aggregates.observe(meter["meter_point_id"], kind, day.day, result[kind])
+            expected = active[kind][day.day] if active is not None else None
+            if expected is not None and abs(sum(result[kind]) - expected) > RANGE_VERIFY_TOLERANCE:
+                self.metrics.range_mismatches += 1
+                _LOGGER.debug(f"Energa [{meter_point_id}] {day.day} {kind}: DAY={sum(result[kind]):.3f} != MONTH={expected:.3f}")
+
+        _LOGGER.debug(f"Historia {day.day} (ts={ts}): Import={len(result['import'])} pkt, Export={len(result['export'])} pkt")
+
+        return result
 
-        _LOGGER.debug(f"Historia {date.date()} (ts={ts}): Import={len(result['import'])} pkt, Export={len(result['export'])} pkt")
+    async def async_find_active_days(self, meter_point_id, first_day, last_day):
+        """Tryb zakresowy: jedno zapytanie MONTH na miesiąc i rejestr zamiast DAY dla każdego dnia.
 
+        Zwraca {"import": {dzień: suma z MONTH}, "export": {...}} - tylko dni z niezerowym zużyciem.
+        Dni, których MONTH nie opisał jednoznacznie, mają wartość None (pobierzemy je przez DAY bez weryfikacji).
+        """
+        result = {"import": {}, "export": {}}
+        meter = await self._async_get_meter(meter_point_id)
+        if not meter: return result
+
+        months = []
+        month = first_day.replace(day=1)
+        while month <= last_day:
+            months.append(month)
+            month = (month + timedelta(days=32)).replace(day=1)
+
+        sem = asyncio.Semaphore(self._max_concurrency)
+
+        async def _month(kind, obis, month_start):
+            ts = local_day(month_start).chart_ts
+            async with sem: vals = await self._fetch_chart(meter_point_id, obis, ts, "MONTH")
+            n_days = ((month_start + timedelta(days=32)).replace(day=1) - month_start).days
+            for i in range(n_days):
+                day = month_start + timedelta(days=i)
+                if not first_day <= day <= last_day: continue
+                # Nieoczekiwany kształt odpowiedzi, brak dnia albo null (NaN) - pobieramy go przez DAY
+                value = vals[i] if len(vals) <= n_days and i < len(vals) else None
+                if value is not None and isnan(value): value = None
+                if value is None or value > 0: result[kind][day] = value
+
+        jobs = []
+        for kind, obis_key in (("import", "obis_plus"), ("export", "obis_minus")):
+            if meter.get(obis_key): jobs.extend(_month(kind, meter[obis_key], m) for m in months)
+        await asyncio.gather(*jobs)
         return result
 
+    async def _async_get_meter(self, meter_point_id):
+        meter = next((m for m in self._meters_data if m["meter_point_id"] == meter_point_id), None)
+        if not meter:
+            await self.async_get_data()
+            meter = next((m for m in self._meters_data if m["meter_point_id"] == meter_point_id), None)
+        return meter
+
     async def _fetch_all_meters(self):
         data = await self._api_get(DATA_ENDPOINT)
         if not data.get("response"): raise EnergaConnectionError("Empty response")
@@ -92,7 +227,7 @@ class EnergaAPI:
             meter_obj = {
                 "meter_point_id": mp.get("id"), "ppe": ppe, "meter_serial": serial, "tariff": mp.get("tariff"),
                 "address": ag.get("address"), "contract_date": c_date, "daily_pobor": 0.0, "daily_produkcja": 0.0,
-                "total_plus": 0.0, "total_minus": 0.0, "obis_plus": None, "obis_minus": None
+                "total_plus": 0.0, "total_minus": 0.0, "obis_plus": None, "obis_minus": None, "chart_hours": 0
             }
 
             # Pobieranie Total z lastMeasurements
@@ -107,23 +242,91 @@ class EnergaAPI:
         return meters_found
 
 
-    async def _fetch_chart(self, meter_id, obis, timestamp):
-        # ... reszta funkcji _fetch_chart pozostaje bez zmian ...
-        params = {"meterPoint": meter_id, "type": "DAY", "meterObject": obis, "mainChartDate": str(timestamp)}
-        if self._token: params["token"] = self._token
-        data = await self._api_get(CHART_ENDPOINT, params=params)
-        try: return [ (p.get("zones", [0])[0] or 0.0) for p in data["response"]["mainChart"] ]
-        except: return []
+    def cached_day(self, meter_id, obis, day):
+        """Pełny wektor zamkniętego dnia z cache wykresów albo None - bez zapytania do API."""
+        cal = local_day(day)
+        if self._cache is None or not self._is_closed(cal.chart_ts): return None
+        cached = self._cache.get(self._cache.key(meter_id, obis, cal.chart_ts))
+        return cached if cached is not None and len(cached) == cal.hours else None
 
-    async def _api_get(self, path, params=None):
-        url = f"{BASE_URL}{path}"
+    async def _fetch_chart(self, meter_id, obis, timestamp, chart_type="DAY", use_cache=True):
+        # Zamknięte okresy (kończące się przed wczoraj) się nie zmieniają - bierzemy je z cache na dysku
+        cache_key = None
+        if self._cache is not None and self._is_closed(timestamp, chart_type):
+            cache_key = self._cache.key(meter_id, obis, timestamp, chart_type)
+            expected = self._chart_length(timestamp, chart_type)
+            # Niepełny wektor (z wersji sprzed tej kontroli) traktujemy jak brak wpisu
+            if use_cache and (cached := self._cache.get(cache_key)) is not None and len(cached) == expected:
+                self.metrics.cache_hits += 1
+                return cached
+            self.metrics.cache_misses += 1
+
+        params = {"meterPoint": meter_id, "type": chart_type, "meterObject": obis, "mainChartDate": str(timestamp)}
+        # Z odpowiedzi zostaje od razu sam wektor - drzewo JSON nie wychodzi poza _request
+        vals = await self._api_get(CHART_ENDPOINT, params=params, decode=month_values if chart_type == "MONTH" else chart_values)
+        # Tylko pełne okresy (bez dni NaN) - dane opublikowane z opóźnieniem nie mogą zostać zamrożone jako niepełne
+        if cache_key and len(vals) == expected and not any(isnan(v) for v in vals): self._cache.put(cache_key, vals)
+        return vals
+
+    @staticmethod
+    def _chart_length(timestamp, chart_type="DAY"):
+        """Liczba punktów pełnego wykresu: godziny doby (23/24/25) albo dni miesiąca."""
+        day = datetime.fromtimestamp(int(timestamp) / 1000, TZ).date()
+        if chart_type == "MONTH": return ((day.replace(day=1) + timedelta(days=32)).replace(day=1) - day.replace(day=1)).days
+        return local_day(day).hours
+
+    @staticmethod
+    def _is_closed(timestamp, chart_type="DAY"):
+        last = datetime.fromtimestamp(int(timestamp) / 1000, TZ).date()
+        if chart_type == "MONTH": last = (last.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        return last < today() - timedelta(days=1)
+
+    async def _api_get(self, path, params=None, decode=None):
+        """GET z single-flight: identyczne zapytania w locie (path + params bez tokena) dzielą jeden request.
+
+        Wynik jest współdzielony między wołającymi - traktujemy go jako tylko do odczytu.
+        """
+        key = (path, tuple(sorted((k, str(v)) for k, v in (params or {}).items() if k != "token")))
+        if (inflight := self._inflight.get(key)) is None:
+            inflight = self._inflight[key] = asyncio.ensure_future(self._api_get_once(path, params, decode))
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else: self.metrics.coalesced += 1
+        # shield: anulowanie jednego wołającego nie przerywa zapytania pozostałym
+        return await asyncio.shield(inflight)
+
+    async def _api_get_once(self, path, params=None, decode=None):
+        await self._async_ensure_login()
+        gen = self._login_gen
+        try: return await self._request(path, params, self._token, decode)
+        except EnergaTokenExpiredError:
+            # Token wygasł: jeden login pod lockiem i transparentne powtórzenie zapytania
+            _LOGGER.debug(f"Energa: token wygasł ({path}), ponowne logowanie")
+            await self._async_relogin(gen)
+            return await self._request(path, params, self._token, decode)
+
+    async def _request(self, path, params=None, token=None, decode=None):
+        url = f"{self._base_url}{path}"
         final_params = params.copy() if params else {}
-        if self._token and "token" not in final_params: final_params["token"] = self._token
-        async with self._session.get(url, headers=HEADERS, params=final_params, ssl=False) as resp:
-            # FIX: OBSŁUGA BŁĘDÓW 401/403
-            if resp.status == 401 or resp.status == 403:
-                # Wyrzucamy nasz nowy wyjątek. Coordinator go złapie i spróbuje ponownego logowania.
-                raise EnergaTokenExpiredError(f"API returned {resp.status} for {url}")
-
-            resp.raise_for_status()
-            return await resp.json()
+        if token: final_params["token"] = token
+        # Wspólny limiter konta: każde zapytanie czeka na token i raportuje status/opóźnienie
+        await self._limiter.acquire()
+        started = time.monotonic()
+        try:
+            async with self._session.get(url, headers=HEADERS, params=final_params) as resp:
+                latency = time.monotonic() - started
+                self._limiter.on_response(resp.status, latency)
+                self.metrics.record(path, latency, resp.status >= 400)
+                # FIX: OBSŁUGA BŁĘDÓW 401/403
+                if resp.status == 401 or resp.status == 403:
+                    # _api_get_once łapie go, loguje ponownie i powtarza zapytanie
+                    raise EnergaTokenExpiredError(f"API returned {resp.status} for {url}")
+
+                resp.raise_for_status()
+                # Surowe bajty prosto do parsera; decode wyciąga tylko potrzebne pola
+                try: data = json_loads(await resp.read())
+                except ValueError as err: raise EnergaConnectionError(f"Invalid JSON from {path}") from err
+                return decode(data) if decode else data
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            self._limiter.on_error()
+            self.metrics.record(path, time.monotonic() - started, True)
+            raise
@@ -0,0 +1,96 @@
+"""Backfill engine for Energa Mobile history import."""
+from array import array
+import asyncio
+from bisect import bisect_right
+from collections import deque
+from datetime import timedelta
+from itertools import accumulate, islice
+import logging
+
+from .day_calendar import local_day
+
+_LOGGER = logging.getLogger(__name__)
+
+def build_day_statistics(bounds, base, vals, first_hour=0, day_start_row=True):
+    """Wiersze StatisticData dla godzin [first_hour, len(vals)) jednego dnia.
+
+    `bounds` to granice godzin doby w UTC (LocalDay.bounds). Sumy skumulowane liczone są jednym
+    `accumulate` do array('d'); godzina h trafia pod start bounds[h+1], ujemne wartości (brak pomiaru)
+    nie dostają wiersza. Zwraca (wiersze, suma po ostatniej godzinie).
+    """
+    rows = [{"start": bounds[0], "state": base, "sum": base}] if day_start_row else []
+    hours = vals[first_hour:len(bounds) - 1]
+    if not len(hours): return rows, base
+    sums = array('d', accumulate((v if v > 0 else 0.0 for v in hours), initial=base))
+    rows.extend(
+        {"start": start, "state": s, "sum": s}
+        for start, v, s in zip(bounds[first_hour + 1:], hours, islice(sums, 1, None))
+        if v >= 0
+    )
+    return rows, sums[-1]
+
+def find_repair_runs(stored, days):
+    """Ciągi kolejnych dni do naprawy w statystyce `stored` ({timestamp startu: sum}).
+
+    Dzień jest do naprawy, gdy brakuje którejś jego godziny albo suma nie wzrosła przez całą dobę.
+    Sprawdzamy tylko dni między pierwszym a ostatnim zapisanym wierszem (dalej to zwykły import, nie dziura).
+    Ciąg jest wydłużany, dopóki nie ma wiersza końca ostatniego dnia - od niego liczymy przesunięcie sum.
+    Zwraca (ciągi dni, liczba dni z brakami, liczba dni płaskich).
+    """
+    if not stored: return [], 0, 0
+    first, last = min(stored), max(stored)
+    runs, missing, flat = [], 0, 0
+    for day in days:
+        slots = local_day(day).slots
+        if slots[0] < first or slots[-1] > last: continue
+        if runs and runs[-1][-1] >= day: continue
+        if any(ts not in stored for ts in slots[1:]): missing += 1
+        elif slots[0] in stored and stored[slots[-1]] - stored[slots[0]] <= 0: flat += 1
+        else: continue
+        run = runs[-1] if runs and runs[-1][-1] == day - timedelta(days=1) else None
+        if run is None: runs.append(run := [])
+        run.append(day)
+        # Brak wiersza końca dnia - dokładamy kolejny dzień, aż trafimy na zapisany punkt odniesienia
+        while slots[-1] not in stored:
+            day = day + timedelta(days=1)
+            slots = local_day(day).slots
+            if slots[-1] > last: break
+            run.append(day)
+        if slots[-1] not in stored: runs.pop()
+    return runs, missing, flat
+
+def sum_before(stored_keys, stored, ts):
+    """Suma z ostatniego wiersza o starcie <= ts (stored_keys posortowane) albo None."""
+    i = bisect_right(stored_keys, ts)
+    return stored[stored_keys[i - 1]] if i else None
+
+async def async_iter_days(fetch, days, workers):
+    """Pobiera dni współbieżnie (max `workers` naraz) i zwraca (day, data, err) w kolejności dni.
+
+    Okno zaplanowanych zadań jest ograniczone do 2x workers, więc pamięć nie rośnie z długością zakresu.
+    Tempo zapytań reguluje limiter w EnergaAPI.
+    """
+    workers = max(1, int(workers))
+    sem = asyncio.Semaphore(workers)
+    days_iter = iter(days)
+    pending = deque()
+
+    async def _one(day):
+        async with sem: return await fetch(day)
+
+    def _schedule():
+        day = next(days_iter, None)
+        if day is not None: pending.append((day, asyncio.ensure_future(_one(day))))
+
+    for _ in range(workers * 2): _schedule()
+    try:
+        while pending:
+            day, task = pending.popleft()
+            _schedule()
+            try: data = await task
+            except Exception as err:
+                yield day, None, err
+                continue
+            yield day, data, None
+    finally:
+        for _, task in pending: task.cancel()
@@ -0,0 +1,86 @@
+"""Persistent caches for Energa Mobile: finalized chart vectors and meter metadata."""
+from array import array
+from collections import OrderedDict
+from datetime import date
+import logging
+
+from homeassistant.helpers.storage import Store
+
+from .const import (
+    CHART_CACHE_KEY, CHART_CACHE_VERSION, CHART_CACHE_MAX_ENTRIES, CHART_CACHE_SAVE_DELAY,
+    METER_STORE_KEY, METER_STORE_VERSION, METER_STORE_SAVE_DELAY,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+class EnergaChartCache:
+    """Wektory zamkniętych okresów, klucz (meter_point_id, obis, dzień[, typ wykresu]), eviction LRU."""
+
+    def __init__(self, hass, max_entries=CHART_CACHE_MAX_ENTRIES):
+        self._store = Store(hass, CHART_CACHE_VERSION, CHART_CACHE_KEY)
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(meter_id, obis, timestamp, chart_type="DAY"):
+        if chart_type != "DAY": return f"{meter_id}|{obis}|{chart_type}|{timestamp}"
+        return f"{meter_id}|{obis}|{timestamp}"
+
+    async def async_load(self):
+        # Ładowane w tle - wpisy dodane w międzyczasie zostają najnowsze w LRU
+        data = await self._store.async_load() or {}
+        loaded = OrderedDict((key, array('d', vals)) for key, vals in data.get("entries", []))
+        loaded.update(self._entries)
+        self._entries = loaded
+        self._evict()
+        _LOGGER.debug(f"Energa cache: wczytano {len(self._entries)} dni")
+
+    def get(self, key):
+        vals = self._entries.get(key)
+        if vals is None: return None
+        self._entries.move_to_end(key)
+        return array('d', vals)
+
+    def put(self, key, vals):
+        self._entries[key] = array('d', vals)
+        self._entries.move_to_end(key)
+        self._evict()
+        self._store.async_delay_save(self._data_to_save, CHART_CACHE_SAVE_DELAY)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _data_to_save(self):
+        return {"entries": [[key, vals.tolist()] for key, vals in self._entries.items()]}
+
+# Tylko stałe dane licznika - odczyty i wykresy zawsze z API
+METER_FIELDS = ("meter_point_id", "ppe", "meter_serial", "tariff", "address", "contract_date", "obis_plus", "obis_minus")
+
+class EnergaMeterStore:
+    """Lista liczników konta z ostatniego /resources/user/data."""
+
+    def __init__(self, hass, entry_id):
+        self._store = Store(hass, METER_STORE_VERSION, f"{METER_STORE_KEY}.{entry_id}")
+        self._meters = []
+
+    async def async_load(self):
+        data = await self._store.async_load() or {}
+        self._meters = data.get("meters", [])
+        return [
+            {**m, "contract_date": date.fromisoformat(m["contract_date"]) if m.get("contract_date") else None}
+            for m in self._meters
+        ]
+
+    def async_set(self, meters):
+        self._meters = [
+            {k: (m.get(k).isoformat() if k == "contract_date" and m.get(k) else m.get(k)) for k in METER_FIELDS}
+            for m in meters
+        ]
+        self._store.async_delay_save(lambda: {"meters": self._meters}, METER_STORE_SAVE_DELAY)
+
+    async def async_remove(self):
+        await self._store.async_remove()
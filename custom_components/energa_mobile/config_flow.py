@@ -4,10 +4,13 @@ import voluptuous as vol
 from datetime import datetime
 from homeassistant import config_entries
 from homeassistant.core import callback
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers import selector
 from .api import EnergaAPI, EnergaAuthError
-from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD
+from .session import async_create_session
+from .const import (
+    DOMAIN, CONF_USERNAME, CONF_PASSWORD, CONF_EXTERNAL_STATISTICS, CONF_TARIFF, CONF_PRICE_PEAK, CONF_PRICE_OFFPEAK,
+    TARIFF_AUTO, TARIFF_SCHEDULES,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -21,10 +24,9 @@ class EnergaConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     async def async_step_user(self, user_input=None):
         errors = {}
         if user_input is not None:
-            session = async_get_clientsession(self.hass)
-            api = EnergaAPI(user_input[CONF_USERNAME], user_input[CONF_PASSWORD], session)
             try:
-                await api.async_login()
+                async with async_create_session(self.hass) as session:
+                    await EnergaAPI(user_input[CONF_USERNAME], user_input[CONF_PASSWORD], session).async_login()
                 await self.async_set_unique_id(user_input[CONF_USERNAME])
                 self._abort_if_unique_id_configured()
                 return self.async_create_entry(title=user_input[CONF_USERNAME], data=user_input)
@@ -39,12 +41,10 @@ class EnergaConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     async def async_step_reauth_confirm(self, user_input=None):
         errors = {}
         if user_input is not None:
-            session = async_get_clientsession(self.hass)
             u = self.reauth_entry.data[CONF_USERNAME]
             p = user_input[CONF_PASSWORD]
-            api = EnergaAPI(u, p, session)
             try:
-                await api.async_login()
+                async with async_create_session(self.hass) as session: await EnergaAPI(u, p, session).async_login()
                 self.hass.config_entries.async_update_entry(self.reauth_entry, data={CONF_USERNAME: u, CONF_PASSWORD: p})
                 await self.hass.config_entries.async_reload(self.reauth_entry.entry_id)
                 return self.async_abort(reason="reauth_successful")
@@ -57,25 +57,24 @@ class EnergaOptionsFlow(config_entries.OptionsFlow):
         self._config_entry = config_entry
 
     async def async_step_init(self, user_input=None):
-        return self.async_show_menu(step_id="init", menu_options=["credentials", "history"])
+        return self.async_show_menu(step_id="init", menu_options=["credentials", "history", "statistics", "tariff"])
 
     async def async_step_credentials(self, user_input=None):
         errors = {}
         if user_input is not None:
-            session = async_get_clientsession(self.hass)
-            api = EnergaAPI(user_input[CONF_USERNAME], user_input[CONF_PASSWORD], session)
             try:
-                await api.async_login()
+                async with async_create_session(self.hass) as session:
+                    await EnergaAPI(user_input[CONF_USERNAME], user_input[CONF_PASSWORD], session).async_login()
                 self.hass.config_entries.async_update_entry(self._config_entry, data=user_input)
                 await self.hass.config_entries.async_reload(self._config_entry.entry_id)
-                return self.async_create_entry(title="", data={})
+                return self.async_create_entry(title="", data=dict(self._config_entry.options))
             except EnergaAuthError: errors["base"] = "invalid_auth"
             except Exception: errors["base"] = "cannot_connect"
         current_user = self._config_entry.data.get(CONF_USERNAME)
         return self.async_show_form(step_id="credentials", data_schema=vol.Schema({vol.Required(CONF_USERNAME, default=current_user): str, vol.Required(CONF_PASSWORD): str}), errors=errors)
 
     async def async_step_history(self, user_input=None):
-        from .__init__ import run_history_import
+        from .__init__ import async_submit_import
         api = self.hass.data.get(DOMAIN, {}).get(self._config_entry.entry_id)
         if not api: return self.async_abort(reason="integration_not_ready")
 
@@ -92,7 +91,25 @@ class EnergaOptionsFlow(config_entries.OptionsFlow):
             if diff < 1: diff = 1
             meters = await api.async_get_data()
             for meter in meters:
-                self.hass.async_create_task(run_history_import(self.hass, api, meter["meter_point_id"], start_date, diff))
-            return self.async_create_entry(title="", data={})
+                await async_submit_import(self.hass, self._config_entry, meter["meter_point_id"], start_date, diff)
+            return self.async_create_entry(title="", data=dict(self._config_entry.options))
 
         return self.async_show_form(step_id="history", data_schema=vol.Schema({vol.Required("start_date", default=default_date): selector.DateSelector()}), description_placeholders={"contract_date": contract_str})
+
+    async def async_step_statistics(self, user_input=None):
+        if user_input is not None:
+            return self.async_create_entry(title="", data={**self._config_entry.options, **user_input})
+        current = self._config_entry.options.get(CONF_EXTERNAL_STATISTICS, False)
+        return self.async_show_form(step_id="statistics", data_schema=vol.Schema({vol.Required(CONF_EXTERNAL_STATISTICS, default=current): bool}))
+
+    async def async_step_tariff(self, user_input=None):
+        options = self._config_entry.options
+        if user_input is not None:
+            # Puste ceny = koszty wyłączone
+            data = {k: v for k, v in options.items() if k not in (CONF_PRICE_PEAK, CONF_PRICE_OFFPEAK)}
+            return self.async_create_entry(title="", data={**data, **user_input})
+        return self.async_show_form(step_id="tariff", data_schema=vol.Schema({
+            vol.Required(CONF_TARIFF, default=options.get(CONF_TARIFF, TARIFF_AUTO)): vol.In([TARIFF_AUTO, *TARIFF_SCHEDULES]),
+            vol.Optional(CONF_PRICE_PEAK, description={"suggested_value": options.get(CONF_PRICE_PEAK)}): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Optional(CONF_PRICE_OFFPEAK, description={"suggested_value": options.get(CONF_PRICE_OFFPEAK)}): vol.All(vol.Coerce(float), vol.Range(min=0)),
+        }))
@@ -1,8 +1,20 @@
 """Constants for the Energa Mobile integration."""
+from datetime import timedelta
 
 DOMAIN = "energa_mobile"
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
+# Opcja: import historii i statystyki live jako statystyki zewnętrzne (energa_mobile:...)
+CONF_EXTERNAL_STATISTICS = "external_statistics"
+# Pole serwisów: konto (config entry), którego dotyczy wywołanie - bez niego wszystkie załadowane konta
+ATTR_CONFIG_ENTRY = "config_entry"
+ATTR_METER_POINT_ID = "meter_point_id"
+# Opcje taryfy: kod (auto = z licznika) i ceny stref [zł/kWh] - koszty importu jako statystyka energa_mobile:cost_import_...
+CONF_TARIFF = "tariff"
+CONF_PRICE_PEAK = "price_peak"
+CONF_PRICE_OFFPEAK = "price_offpeak"
+TARIFF_AUTO = "auto"
+COST_CURRENCY = "PLN"
 
 BASE_URL = "https://api-mojlicznik.energa-operator.pl/dp"
 LOGIN_ENDPOINT = "/apihelper/UserLogin"
@@ -10,6 +22,90 @@ SESSION_ENDPOINT = "/apihelper/SessionStatus"
 DATA_ENDPOINT = "/resources/user/data"
 CHART_ENDPOINT = "/resources/mchart"
 
+# Wspólny connector HTTP domeny (wszystkie konta): pula połączeń, keep-alive, cache DNS, timeouty [s]
+DATA_CONNECTOR = "energa_mobile_connector"
+HTTP_POOL_LIMIT = 20
+HTTP_POOL_LIMIT_PER_HOST = 10
+HTTP_KEEPALIVE = 60
+HTTP_DNS_CACHE_TTL = 300
+HTTP_TIMEOUT_TOTAL = 60
+HTTP_TIMEOUT_CONNECT = 10
+HTTP_TIMEOUT_READ = 30
+
+# Token odświeżamy proaktywnie po tylu sekundach od logowania
+TOKEN_REFRESH_AFTER = 1800
+
+# Przedziały histogramu opóźnień zapytań [s]
+METRICS_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+# Ile zapytań o wykresy (liczniki x rejestry) leci równolegle przy odświeżaniu
+DEFAULT_CHART_CONCURRENCY = 4
+
+# Adaptacyjny limiter zapytań (token bucket, wspólny dla konta), wartości w zapytaniach/s
+RATE_LIMIT_INITIAL = 4.0
+RATE_LIMIT_MIN = 0.5
+RATE_LIMIT_MAX = 10.0
+RATE_LIMIT_BURST = 4
+RATE_LIMIT_INCREASE = 0.25
+RATE_LIMIT_LATENCY_TARGET = 2.0
+
+# Harmonogram odpytywania: gęsto wokół spodziewanej publikacji danych, rzadko poza nią
+POLL_BASE_INTERVAL = timedelta(hours=1)
+POLL_DENSE_INTERVAL = timedelta(minutes=10)
+POLL_MAX_INTERVAL = timedelta(hours=3)
+POLL_WINDOW = timedelta(minutes=30)
+POLL_HISTORY = 24
+
+# Import historii: liczba równoległych workerów (tempo ogranicza limiter API)
+DEFAULT_HISTORY_WORKERS = 4
+# Tryb zakresowy: dopuszczalna różnica [kWh] między sumą DAY a wartością dnia z wykresu MONTH
+RANGE_VERIFY_TOLERANCE = 0.01
+# Zapis statystyk paczkami: flush po tylu dniach albo wierszach (co pierwsze)
+HISTORY_CHUNK_DAYS = 31
+HISTORY_CHUNK_ROWS = 5000
+# Zadania importu/naprawy per konto: kolejka per licznik, sensor postępu odświeżany co tyle sekund
+DATA_JOBS = "energa_mobile_jobs"
+SIGNAL_JOB_PROGRESS = "energa_mobile_job_progress"
+JOB_PROGRESS_INTERVAL = 5
+# Naprawa dziur: ile dni za skanowanym zakresem szukamy punktu odniesienia sum
+REPAIR_REFERENCE_DAYS = 7
+SIGNAL_STATISTICS_ADJUSTED = "energa_mobile_statistics_adjusted"
+# Import z pliku: ile bajtów czytamy naraz (readlines hint) w executorze
+TRANSFER_READ_CHUNK = 1 << 18
+# Checkpoint importu historii (wznowienie po restarcie / kolejnym uruchomieniu)
+DATA_HISTORY_CHECKPOINTS = "energa_mobile_history_checkpoints"
+HISTORY_CHECKPOINT_KEY = "energa_mobile.history_checkpoint"
+HISTORY_CHECKPOINT_VERSION = 1
+
+# Kalendarz dób lokalnych (granice godzin w UTC): ile dni trzymamy w LRU
+DAY_CALENDAR_SIZE = 4096
+
+# Strefy taryf (godziny lokalne [od, do) strefy pozaszczytowej; weekend = całe soboty i niedziele poza szczytem)
+TARIFF_SCHEDULES = {
+    "G11": {"offpeak": (), "weekend": False},
+    "G12": {"offpeak": ((13, 15), (22, 6)), "weekend": False},
+    "G12w": {"offpeak": ((13, 15), (22, 6)), "weekend": True},
+}
+
+# Metadane liczników konta (HA Store) - encje powstają z nich przy starcie bez czekania na API
+METER_STORE_KEY = "energa_mobile.meters"
+METER_STORE_VERSION = 1
+METER_STORE_SAVE_DELAY = 5
+
+# Agregaty z wektorów godzinowych (bez dodatkowych zapytań): retencja dni/tygodni/miesięcy i godzin
+AGGREGATES_STORE_KEY = "energa_mobile.aggregates"
+AGGREGATES_STORE_VERSION = 1
+AGGREGATES_SAVE_DELAY = 60
+AGGREGATES_RETENTION_DAYS = 400
+AGGREGATES_HOURS = 48
+
+# Cache zamkniętych dni z /resources/mchart (HA Store)
+DATA_CHART_CACHE = "energa_mobile_chart_cache"
+CHART_CACHE_KEY = "energa_mobile.chart_cache"
+CHART_CACHE_VERSION = 1
+CHART_CACHE_MAX_ENTRIES = 20000
+CHART_CACHE_SAVE_DELAY = 30
+
 HEADERS = {
     "User-Agent": "Energa/3.1.2 (pl.energa-operator.mojlicznik; build:1; iOS 16.6.1) Alamofire/5.6.4",
     "Accept": "application/json",
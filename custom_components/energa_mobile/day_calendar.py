@@ -0,0 +1,37 @@
+"""Local day calendar (Europe/Warsaw) with precomputed UTC hour boundaries."""
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+from .const import DAY_CALENDAR_SIZE
+
+TZ = ZoneInfo("Europe/Warsaw")
+_HOUR = timedelta(hours=1)
+
+class LocalDay(NamedTuple):
+    """Doba lokalna: granice godzin w UTC (hours + 1 punktów, ostatni = następna północ) i mainChartDate."""
+    day: date
+    start: datetime
+    hours: int
+    bounds: tuple
+    slots: tuple
+    chart_ts: int
+
+@lru_cache(maxsize=DAY_CALENDAR_SIZE)
+def local_day(day):
+    # Arytmetyka w UTC - doby 23/25-godzinne przy zmianie czasu dostają właściwe godziny
+    start = datetime(day.year, day.month, day.day, tzinfo=TZ).astimezone(timezone.utc)
+    nxt = day + timedelta(days=1)
+    end = datetime(nxt.year, nxt.month, nxt.day, tzinfo=TZ).astimezone(timezone.utc)
+    hours = round((end - start) / _HOUR)
+    bounds = tuple(start + h * _HOUR for h in range(hours + 1))
+    return LocalDay(day, start, hours, bounds, tuple(b.timestamp() for b in bounds), int(start.timestamp() * 1000))
+
+def today():
+    return datetime.now(TZ).date()
+
+def day_of(value):
+    """Dzień lokalny dla daty, naiwnego datetime (dzień z kalendarza) albo aware datetime (przeliczany do TZ)."""
+    if isinstance(value, datetime): return value.astimezone(TZ).date() if value.tzinfo else value.date()
+    return value
@@ -0,0 +1,29 @@
+"""Response decoding for the Energa API client."""
+from array import array
+
+# orjson (jest w Home Assistant) parsuje bajty bez dekodowania do str i kilka razy szybciej niż json
+try: from orjson import loads as json_loads
+except ImportError: from json import loads as json_loads
+
+def chart_values(data, missing=0.0):
+    """mainChart -> array('d') z zones[0] każdego punktu, bez nieopublikowanych (null) godzin na końcu.
+
+    Null w środku wykresu dostaje wartość `missing`.
+    """
+    vals = array('d')
+    published = 0
+    try:
+        for p in data["response"]["mainChart"]:
+            v = (p.get("zones", [0]) or [None])[0]
+            if v is None: vals.append(missing)
+            else:
+                vals.append(v)
+                published = len(vals)
+    except (KeyError, AttributeError, TypeError): return array('d')
+    # Długość wektora = opublikowane godziny (ostatnia nie-null wartość)
+    del vals[published:]
+    return vals
+
+def month_values(data):
+    """Wykres MONTH: dzień bez danych (null) zostaje NaN - nie może udawać dnia bez zużycia."""
+    return chart_values(data, missing=float("nan"))
@@ -0,0 +1,24 @@
+"""Diagnostics support for Energa Mobile."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_USERNAME, CONF_PASSWORD, DATA_CHART_CACHE
+
+TO_REDACT = {CONF_USERNAME, CONF_PASSWORD, "address", "ppe", "meter_serial", "title", "unique_id"}
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    api = hass.data[DOMAIN][entry.entry_id]
+    cache = hass.data.get(DATA_CHART_CACHE)
+    # Bez wektorów godzinowych - tylko metadane liczników
+    meters = [
+        {k: (str(v) if k == "contract_date" else v) for k, v in m.items() if not k.startswith("hourly_")}
+        for m in api._meters_data
+    ]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "metrics": api.metrics.as_dict(),
+        "rate_limit": round(api._limiter.rate, 2),
+        "chart_cache_entries": len(cache) if cache is not None else None,
+        "meters": async_redact_data(meters, TO_REDACT),
+    }
@@ -0,0 +1,477 @@
+"""History import for Energa Mobile."""
+import asyncio
+from contextlib import aclosing
+from datetime import timedelta, datetime, date, time
+import logging
+
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.dispatcher import async_dispatcher_connect, async_dispatcher_send
+from homeassistant.helpers.storage import Store
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics, async_import_statistics, get_last_statistics, statistics_during_period,
+)
+from homeassistant.components.recorder.models import StatisticMetaData
+from homeassistant.util import dt as dt_util
+
+from .backfill import async_iter_days, build_day_statistics, find_repair_runs, sum_before
+from .day_calendar import TZ, local_day, today as local_today
+from .const import (
+    DOMAIN, DEFAULT_HISTORY_WORKERS, HISTORY_CHUNK_DAYS, HISTORY_CHUNK_ROWS,
+    DATA_HISTORY_CHECKPOINTS, HISTORY_CHECKPOINT_KEY, HISTORY_CHECKPOINT_VERSION,
+    REPAIR_REFERENCE_DAYS, SIGNAL_STATISTICS_ADJUSTED, COST_CURRENCY,
+)
+from .tariffs import tariff_pricing
+
+_LOGGER = logging.getLogger(__name__)
+
+async def run_history_import(hass, api, meter_id, start_date, days, workers=DEFAULT_HISTORY_WORKERS, range_mode=False, external=False, job=None, pricing=None):
+    _LOGGER.info(f"Energa [{meter_id}]: Start importu (workers={workers}, range_mode={range_mode}, external={external}).")
+    entity_id_imp, entity_id_exp = statistic_ids(hass, meter_id, external)
+    cp_key = _checkpoint_key(meter_id, external)
+
+    # Wznowienie: kontynuujemy sumę od checkpointu albo ostatniej statystyki w recorderze
+    checkpoints = await async_get_checkpoints(hass)
+    today = local_today()
+    end_day = min(start_date.date() + timedelta(days=days), today)
+    (first_imp, current_sum_imp, old_end_imp), (first_exp, current_sum_exp, old_end_exp) = await _async_resume_point(
+        hass, checkpoints, cp_key, (entity_id_imp, entity_id_exp), start_date.date(), end_day
+    )
+    first_day = min(first_imp, first_exp)
+
+    target_days = [datetime.combine(first_day, time()) + timedelta(days=i) for i in range((end_day - first_day).days)]
+    if not target_days:
+        _LOGGER.warning(f"Energa [{meter_id}]: Zakres {start_date.date()}..{end_day - timedelta(days=1)} jest już w statystykach - nic do pobrania.")
+        return
+    if first_day > start_date.date():
+        _LOGGER.info(f"Energa [{meter_id}]: Wznowienie od {first_day}, do pobrania {len(target_days)} dni.")
+    if old_end_imp is not None or old_end_exp is not None:
+        _LOGGER.info(f"Energa [{meter_id}]: Statystyki mają już nowsze dane - import zakresu i przesunięcie sum za {end_day - timedelta(days=1)}.")
+    if job: job.set_total(len(target_days))
+
+    # Tryb zakresowy: wykresy MONTH wskazują dni z zużyciem, DAY pobieramy tylko dla nich
+    active = None
+    if range_mode and target_days:
+        try: active = await api.async_find_active_days(meter_id, target_days[0].date(), target_days[-1].date())
+        except Exception as e: _LOGGER.warning(f"Energa [{meter_id}]: Tryb zakresowy niedostępny ({e}), pobieram wszystkie dni.")
+    if active is not None:
+        _LOGGER.info(f"Energa [{meter_id}]: Tryb zakresowy - dni z danymi: import {len(active['import'])}, eksport {len(active['export'])} z {len(target_days)}.")
+
+    async def _fetch(target_day):
+        return await api.async_get_history_hourly(meter_id, target_day, active)
+
+    chunk_imp = []
+    chunk_exp = []
+    chunk_days = 0
+    last_day = None
+    imported_imp = imported_exp = False
+    costs = await CostChain.async_create(hass, meter_id, pricing, first_imp, end_day)
+
+    async def _flush():
+        nonlocal chunk_imp, chunk_exp, chunk_days, imported_imp, imported_exp
+        # ZAPIS DO BAZY: jedno wywołanie na statistic_id dla całej paczki dni
+        if chunk_imp:
+            async_write_statistics(hass, entity_id_imp, chunk_imp)
+            imported_imp = True
+        if chunk_exp:
+            async_write_statistics(hass, entity_id_exp, chunk_exp)
+            imported_exp = True
+        if costs: costs.flush()
+        chunk_imp, chunk_exp, chunk_days = [], [], 0
+        if last_day is not None: await checkpoints.async_set(cp_key, last_day, current_sum_imp, current_sum_exp)
+
+    # Dni pobierane są równolegle, ale wyniki przychodzą po kolei - łańcuch `sum` zostaje ten sam
+    try:
+        async with aclosing(async_iter_days(_fetch, target_days, workers)) as days_iter:
+            async for target_day, data, err in days_iter:
+                if job: await job.async_wait()
+                last_day = target_day.date()
+                if err is not None:
+                    _LOGGER.error(f"Energa Import Error: {err}")
+                    if job: job.advance()
+                    continue
+                try:
+                    bounds = local_day(last_day).bounds
+                    day_rows = 0
+
+                    # Seria, która jest już dalej (np. eksport zaimportowany wcześniej), czeka na swój pierwszy dzień
+                    # Start dnia: state = sum (z poprzedniego dnia), potem skumulowane godziny
+                    if last_day >= first_imp:
+                        rows, current_sum_imp = build_day_statistics(bounds, current_sum_imp, data.get("import", ()))
+                        chunk_imp.extend(rows)
+                        day_rows += len(rows)
+                        if costs: costs.add_day(last_day, data.get("import", ()))
+
+                    if last_day >= first_exp:
+                        rows, current_sum_exp = build_day_statistics(bounds, current_sum_exp, data.get("export", ()))
+                        chunk_exp.extend(rows)
+                        day_rows += len(rows)
+
+                    chunk_days += 1
+                    if job: job.advance(day_rows)
+                    if chunk_days >= HISTORY_CHUNK_DAYS or len(chunk_imp) + len(chunk_exp) >= HISTORY_CHUNK_ROWS: await _flush()
+
+                except Exception as e: _LOGGER.error(f"Energa Import Error: {e}")
+    except asyncio.CancelledError:
+        # Policzone dni są spójne - zapisujemy je z checkpointem, kolejny import wznowi od tego miejsca
+        await _flush()
+        _LOGGER.info(f"Energa [{meter_id}]: Import anulowany po {last_day}.")
+        raise
+    await _flush()
+    chains = [(entity_id_imp, current_sum_imp, old_end_imp), (entity_id_exp, current_sum_exp, old_end_exp)]
+    if costs: chains.append(costs.chain)
+    shifted = await async_shift_after_range(hass, end_day, chains)
+
+    # FIX: Aktualizujemy stan sensora LIVE TYLKO RAZ - na koniec całego importu.
+    # Statystyki zewnętrzne nie mają encji - żadnych zapisów stanu ani zdarzeń; zakres sprzed nowszych wierszy też nie
+    if external:
+        _LOGGER.info(f"Energa [{meter_id}]: Zakończono import.")
+        return
+    attrs = {"unit_of_measurement": "kWh", "device_class": "energy", "state_class": "total_increasing"}
+    if imported_imp and entity_id_imp not in shifted: hass.states.async_set(entity_id_imp, current_sum_imp, attrs)
+    if imported_exp and entity_id_exp not in shifted: hass.states.async_set(entity_id_exp, current_sum_exp, attrs)
+    _LOGGER.info(f"Energa [{meter_id}]: Zakończono import.")
+
+async def async_shift_after_range(hass, end_day, chains):
+    """Zakres zaimportowany przed istniejącymi wierszami: sumy od końca zakresu przesuwamy o różnicę.
+
+    `chains` to (statistic_id, nowa suma na końcu zakresu, stara suma albo None). Zwraca przesunięte statistic_id.
+    """
+    shifts = [(statistic_id, new - old) for statistic_id, new, old in chains if old is not None]
+    if not shifts: return set()
+    recorder = get_instance(hass)
+    # Wiersz o starcie na końcu zakresu zapisał już import - przesuwamy kolejne
+    after = local_day(end_day).start + timedelta(hours=1)
+    for statistic_id, delta in shifts:
+        unit = _statistic_metadata(statistic_id)["unit_of_measurement"]
+        if abs(delta) > 1e-9: recorder.async_adjust_statistics(statistic_id, after, delta, unit)
+        _LOGGER.info(f"Energa: {statistic_id} - sumy od {after} przesunięte o {delta:+.3f} {unit}.")
+    await recorder.async_block_till_done()
+    for statistic_id, _delta in shifts: async_dispatcher_send(hass, SIGNAL_STATISTICS_ADJUSTED, statistic_id)
+    return {statistic_id for statistic_id, _delta in shifts}
+
+async def run_statistics_repair(hass, api, meter_id, start_date, days, workers=DEFAULT_HISTORY_WORKERS, external=False, job=None):
+    """Naprawa dziur: dni z brakującymi godzinami albo bez przyrostu sumy pobieramy ponownie i przepisujemy.
+
+    Sumy za naprawionym fragmentem przesuwa recorder (adjust_statistics) o różnicę na jego końcu.
+    """
+    _LOGGER.info(f"Energa [{meter_id}]: Start naprawy statystyk.")
+    yesterday = local_today() - timedelta(days=1)
+    first_day = start_date.date()
+    scan_days = [first_day + timedelta(days=i) for i in range(days) if first_day + timedelta(days=i) <= yesterday]
+    if not scan_days: return
+    ids = dict(zip(("import", "export"), statistic_ids(hass, meter_id, external)))
+
+    # Wiersze z zapasem: dzień przed (suma bazowa) i kilka dni po (punkt odniesienia dla przesunięcia)
+    window_start = local_day(first_day - timedelta(days=1)).start
+    window_end = local_day(scan_days[-1] + timedelta(days=REPAIR_REFERENCE_DAYS)).start
+    stored, runs = {}, {}
+    for kind, statistic_id in ids.items():
+        stored[kind] = await _async_stored_sums(hass, statistic_id, window_start, window_end)
+        runs[kind], missing, flat = find_repair_runs(stored[kind], scan_days)
+        if missing or flat: _LOGGER.info(f"Energa [{meter_id}]: {statistic_id} - dni z brakami: {missing}, płaskie: {flat}.")
+
+    repair_days = sorted({day for kind_runs in runs.values() for run in kind_runs for day in run})
+    if job: job.set_total(len(repair_days))
+    if not repair_days:
+        _LOGGER.info(f"Energa [{meter_id}]: Brak dziur w statystykach.")
+        return
+
+    fetched = {}
+    async def _fetch(day):
+        return await api.async_get_history_hourly(meter_id, datetime.combine(day, time()), use_cache=False)
+    async with aclosing(async_iter_days(_fetch, repair_days, workers)) as days_iter:
+        async for day, data, err in days_iter:
+            if job: await job.async_wait()
+            if err is not None: _LOGGER.error(f"Energa Repair Error ({day}): {err}")
+            else: fetched[day] = data
+            if job: job.advance()
+
+    checkpoints = await async_get_checkpoints(hass)
+    recorder = get_instance(hass)
+    repaired = 0
+    for kind, statistic_id in ids.items():
+        keys = sorted(stored[kind])
+        # Przesunięcie z wcześniejszych ciągów (odczytane sumy są sprzed adjust)
+        shift = 0.0
+        for run in runs[kind]:
+            # Tylko pełne wektory - niepełny dzień zostawiłby niespójny koniec ciągu
+            if any(len((fetched.get(day) or {}).get(kind, ())) < local_day(day).hours for day in run):
+                _LOGGER.warning(f"Energa [{meter_id}]: {statistic_id} {run[0]}..{run[-1]} - brak pełnych danych, pomijam.")
+                continue
+            start_ts, end_ts = local_day(run[0]).slots[0], local_day(run[-1]).slots[-1]
+            running = sum_before(keys, stored[kind], start_ts)
+            if running is None: continue
+            running += shift
+            rows = []
+            for day in run:
+                day_rows, running = build_day_statistics(local_day(day).bounds, running, fetched[day][kind])
+                rows.extend(day_rows)
+            async_write_statistics(hass, statistic_id, rows)
+            if job: job.rows += len(rows)
+            delta = running - (stored[kind][end_ts] + shift)
+            if abs(delta) > 1e-9:
+                recorder.async_adjust_statistics(statistic_id, dt_util.utc_from_timestamp(end_ts) + timedelta(hours=1), delta, "kWh")
+                await checkpoints.async_adjust(_checkpoint_key(meter_id, external), kind, run[-1], delta)
+                shift += delta
+            repaired += len(run)
+            _LOGGER.info(f"Energa [{meter_id}]: {statistic_id} naprawiono {run[0]}..{run[-1]} (przesunięcie {delta:+.3f} kWh).")
+
+    # Feed live trzyma sumy w pamięci - po zapisie recordera czyta je od nowa
+    await recorder.async_block_till_done()
+    for statistic_id in ids.values(): async_dispatcher_send(hass, SIGNAL_STATISTICS_ADJUSTED, statistic_id)
+    _LOGGER.info(f"Energa [{meter_id}]: Zakończono naprawę ({repaired} dni).")
+
+async def _async_stored_sums(hass, statistic_id, start, end):
+    """{timestamp startu: sum} godzinowych wierszy statystyki w [start, end)."""
+    stats = await get_instance(hass).async_add_executor_job(
+        statistics_during_period, hass, dt_util.as_utc(start), dt_util.as_utc(end), {statistic_id}, "hour", None, {"sum"}
+    )
+    result = {}
+    for row in stats.get(statistic_id, []):
+        start = row["start"]
+        if isinstance(start, datetime): start = start.timestamp()
+        if row.get("sum") is not None: result[start] = row["sum"]
+    return result
+
+def async_write_statistics(hass, statistic_id, rows):
+    """Statystyki zewnętrzne (energa_mobile:...) idą przez API external, reszta przez import do encji."""
+    if ":" in statistic_id: async_add_external_statistics(hass, _statistic_metadata(statistic_id), rows)
+    else: async_import_statistics(hass, _statistic_metadata(statistic_id), rows)
+
+def _statistic_metadata(statistic_id):
+    if statistic_id.startswith(f"{DOMAIN}:cost_"):
+        return StatisticMetaData(
+            has_mean=False, has_sum=True, name=f"Energa koszt importu {statistic_id.rsplit('_', 1)[1]}", source=DOMAIN,
+            statistic_id=statistic_id, unit_of_measurement=COST_CURRENCY, unit_class=None
+        )
+    if ":" in statistic_id:
+        return StatisticMetaData(
+            has_mean=False, has_sum=True, name=f"Energa {statistic_id.split(':', 1)[1].replace('_', ' ')}", source=DOMAIN,
+            statistic_id=statistic_id, unit_of_measurement="kWh", unit_class="energy"
+        )
+    return StatisticMetaData(
+        has_mean=False, has_sum=True, name=None, source='recorder', statistic_id=statistic_id,
+        unit_of_measurement="kWh", unit_class="energy"
+    )
+
+def cost_statistic_id(meter_id):
+    # Koszty zawsze jako statystyka zewnętrzna - nie ma encji, do której można by je przypiąć
+    return f"{DOMAIN}:cost_import_{meter_id}"
+
+class CostChain:
+    """Sumy kosztów importu liczone w tym samym przebiegu co energia i zapisywane w tym samym flushu.
+
+    Łańcuch wznawia się jak energia: od sumy sprzed zakresu. Nowsze wiersze (np. dzisiejsze z feedu live)
+    przesuwa na końcu async_shift_after_range o różnicę - `chain` to jej wpis dla statystyki kosztów.
+    """
+
+    def __init__(self, hass, statistic_id, pricing, running, old_end):
+        self._hass = hass
+        self._statistic_id = statistic_id
+        self._pricing = pricing
+        self.sum = running
+        self._old_end = old_end
+        self._rows = []
+
+    @classmethod
+    async def async_create(cls, hass, meter_id, pricing, first_day, end_day):
+        """Łańcuch kosztów dla dni [first_day, end_day) albo None, gdy koszty są wyłączone."""
+        if pricing is None: return None
+        statistic_id = cost_statistic_id(meter_id)
+        last = await _async_last_statistic(hass, statistic_id)
+        range_start, range_end = local_day(first_day).start, local_day(end_day).start
+        if last is None or last[0] <= range_start: return cls(hass, statistic_id, pricing, last[1] if last else 0.0, None)
+        old_end = await _async_sum_at(hass, statistic_id, range_end) if last[0] > range_end else None
+        _LOGGER.info(f"Energa [{meter_id}]: Koszty mają już wiersze do {last[0]} - przeliczam je od {first_day}.")
+        return cls(hass, statistic_id, pricing, await _async_sum_at(hass, statistic_id, range_start), old_end)
+
+    @property
+    def chain(self):
+        return self._statistic_id, self.sum, self._old_end
+
+    def add_day(self, day, vals):
+        rows, self.sum = build_day_statistics(local_day(day).bounds, self.sum, self._pricing.day_costs(day, vals))
+        self._rows.extend(rows)
+
+    def flush(self):
+        if self._rows: async_write_statistics(self._hass, self._statistic_id, self._rows)
+        self._rows = []
+
+def _checkpoint_key(meter_id, external):
+    # Osobny checkpoint dla statystyk zewnętrznych - to inny łańcuch sum
+    return f"external_{meter_id}" if external else meter_id
+
+class HistoryCheckpoints:
+    """Ostatni zaimportowany dzień i sumy dla każdego licznika (HA Store)."""
+
+    def __init__(self, hass):
+        self._store = Store(hass, HISTORY_CHECKPOINT_VERSION, HISTORY_CHECKPOINT_KEY)
+        self._lock = asyncio.Lock()
+        self._loaded = False
+        self.data = {}
+
+    async def async_load(self):
+        async with self._lock:
+            if not self._loaded:
+                self.data = await self._store.async_load() or {}
+                self._loaded = True
+
+    def get(self, meter_id):
+        return self.data.get(str(meter_id))
+
+    async def async_set(self, meter_id, day, sum_imp, sum_exp):
+        self.data[str(meter_id)] = {"day": day.isoformat(), "sum_import": sum_imp, "sum_export": sum_exp}
+        await self._store.async_save(self.data)
+
+    async def async_adjust(self, meter_id, kind, after_day, delta):
+        """Naprawa przesunęła sumy za `after_day` - checkpoint dalej w czasie przesuwamy tak samo."""
+        if not (cp := self.get(meter_id)) or date.fromisoformat(cp["day"]) < after_day: return
+        cp[f"sum_{kind}"] += delta
+        await self._store.async_save(self.data)
+
+async def async_get_checkpoints(hass):
+    if (checkpoints := hass.data.get(DATA_HISTORY_CHECKPOINTS)) is None:
+        checkpoints = hass.data[DATA_HISTORY_CHECKPOINTS] = HistoryCheckpoints(hass)
+    await checkpoints.async_load()
+    return checkpoints
+
+async def _async_resume_point(hass, checkpoints, meter_id, statistic_ids, start_day, end_day):
+    """Zwraca [(pierwszy dzień do pobrania, suma startowa, stara suma na końcu zakresu albo None)] dla importu i eksportu.
+
+    Wznawiamy tylko od checkpointu albo ostatniego wiersza, który leży w zakresie [start_day, end_day).
+    Gdy recorder ma już wiersze za zakresem (sensor działa od dawna, feed live), zakres importujemy w całości
+    od sumy sprzed niego, a stara suma na jego końcu posłuży do przesunięcia nowszych wierszy.
+    """
+    range_start, range_end = local_day(start_day).start, local_day(end_day).start
+    cp = checkpoints.get(meter_id)
+    cp_day = date.fromisoformat(cp["day"]) if cp else None
+    result = []
+    for kind, statistic_id in zip(("import", "export"), statistic_ids):
+        last = await _async_last_statistic(hass, statistic_id)
+        old_end = await _async_sum_at(hass, statistic_id, range_end) if last and last[0] > range_end else None
+        if cp_day is not None and start_day - timedelta(days=1) <= cp_day < end_day - timedelta(days=1):
+            result.append((max(start_day, cp_day + timedelta(days=1)), cp[f"sum_{kind}"], old_end))
+        elif last is None: result.append((start_day, 0.0, None))
+        elif old_end is not None: result.append((start_day, await _async_sum_at(hass, statistic_id, range_start), old_end))
+        else:
+            start, last_sum = last
+            local = start.astimezone(TZ)
+            # Ostatni wiersz dnia D ma start o północy D+1 - wtedy dzień D+1 nie ma jeszcze godzin
+            next_day = local.date() if local.time() == time() else local.date() + timedelta(days=1)
+            result.append((max(start_day, next_day), last_sum, None))
+    return result
+
+async def _async_sum_at(hass, statistic_id, when):
+    """Suma ostatniego wiersza o starcie <= `when` (0.0, gdy wcześniej nic nie ma).
+
+    Okres "month" redukuje wiersze godzinowe do ostatniej sumy miesiąca - kilka wierszy zamiast całej historii.
+    """
+    stats = await get_instance(hass).async_add_executor_job(
+        statistics_during_period, hass, dt_util.utc_from_timestamp(0), when + timedelta(hours=1), {statistic_id}, "month", None, {"sum"}
+    )
+    rows = [row for row in stats.get(statistic_id, []) if row.get("sum") is not None]
+    return rows[-1]["sum"] if rows else 0.0
+
+def statistic_ids(hass, meter_id, external=False):
+    """Statystyki importu/eksportu - celujemy w sensory v2 (te czyste) albo w statystyki zewnętrzne domeny."""
+    if external: return tuple(f"{DOMAIN}:{kind}_total_{meter_id}" for kind in ("import", "export"))
+    ent_reg = er.async_get(hass)
+    result = []
+    for kind in ("import", "export"):
+        uid = f"energa_{kind}_total_{meter_id}"
+        result.append(ent_reg.async_get_entity_id("sensor", DOMAIN, uid) or f"sensor.{uid}")
+    return tuple(result)
+
+async def _async_last_statistic(hass, statistic_id):
+    """(start, sum) ostatniego wiersza statystyki w recorderze albo None."""
+    last = await get_instance(hass).async_add_executor_job(
+        get_last_statistics, hass, 1, statistic_id, True, {"sum"}
+    )
+    if not (rows := last.get(statistic_id)): return None
+    start = rows[0]["start"]
+    if not isinstance(start, datetime): start = dt_util.utc_from_timestamp(start)
+    return start, rows[0].get("sum") or 0.0
+
+class LiveStatisticsFeed:
+    """Dopisuje do statystyk nowe godziny z dzisiejszego wektora, który koordynator i tak pobiera."""
+
+    def __init__(self, hass, external=False, options=None):
+        self._hass = hass
+        self._external = external
+        self._options = options or {}
+        # statistic_id -> {"day", "sum": suma po ostatniej zapisanej godzinie, "hours": zapisane godziny, "started"}
+        self._cursors = {}
+        # Naprawa statystyk przesunęła sumy - kursor odczytamy z recordera od nowa
+        self._unsub = async_dispatcher_connect(hass, SIGNAL_STATISTICS_ADJUSTED, self._async_invalidate)
+
+    @callback
+    def _async_invalidate(self, statistic_id):
+        self._cursors.pop(statistic_id, None)
+
+    @callback
+    def async_unload(self):
+        self._unsub()
+
+    async def async_update(self, meter, finishing=None):
+        """Nowe godziny dzisiejszego wektora; `finishing` = (dzień, dane) poprzedniej, jeszcze niedokończonej doby."""
+        meter_id = meter["meter_point_id"]
+        prev_day, prev = finishing or (None, {})
+        feeds = []
+        # Tylko statystyki zewnętrzne - statystykę encji buduje recorder z jej stanu, drugi pisarz rozjechałby sumy
+        if self._external:
+            for statistic_id, kind in zip(statistic_ids(self._hass, meter_id, True), ("import", "export")):
+                feeds.append((statistic_id, meter.get(f"hourly_{kind}"), prev.get(kind)))
+        # Koszt godzin tym samym kursorem co energia
+        if (pricing := tariff_pricing(self._options, meter.get("tariff"))) is not None and (vals := meter.get("hourly_import")) is not None:
+            prev_vals = prev.get("import")
+            feeds.append((
+                cost_statistic_id(meter_id), pricing.day_costs(local_today(), vals),
+                pricing.day_costs(prev_day, prev_vals) if prev_vals is not None else None,
+            ))
+        for statistic_id, vals, prev_vals in feeds:
+            if vals is None: continue
+            try: await self._async_feed(statistic_id, vals, (prev_day, prev_vals) if prev_vals is not None else None)
+            except Exception as err: _LOGGER.warning(f"Energa [{meter_id}]: błąd zapisu statystyk live {statistic_id}: {err}")
+
+    async def _async_feed(self, statistic_id, vals, finishing=None):
+        now = dt_util.utcnow()
+        day = local_day(local_today())
+        cursor = self._cursors.get(statistic_id)
+        if cursor is None:
+            cursor = self._cursors[statistic_id] = await self._async_init_cursor(statistic_id, day, finishing)
+        if cursor["day"] != day.day:
+            # Poprzednia doba: godziny opublikowane po północy dopisujemy, zanim zacznie się dzisiejsza
+            prev = local_day(cursor["day"])
+            if finishing is not None and finishing[0] == cursor["day"]:
+                self._write_hours(statistic_id, cursor, prev, finishing[1], now)
+                if cursor["hours"] < prev.hours: return
+            cursor = self._cursors[statistic_id] = {"day": day.day, "sum": cursor["sum"], "hours": 0, "started": False}
+        self._write_hours(statistic_id, cursor, day, vals, now)
+
+    def _write_hours(self, statistic_id, cursor, local, vals, now):
+        """Zakończone godziny doby, których jeszcze nie ma w statystykach.
+
+        Godzina h dostaje wiersz o starcie bounds[h+1] - zapisujemy ją dopiero, gdy i ta godzina minęła.
+        """
+        done = cursor["hours"]
+        ready = min(len(vals), local.hours, int((now - local.start).total_seconds() // 3600) - 1)
+        if ready <= done: return
+        # Start dnia: state = sum (z poprzedniego dnia) - tylko przy pierwszym zapisie w danym dniu
+        stats, running = build_day_statistics(
+            local.bounds, cursor["sum"], vals[:ready], first_hour=done, day_start_row=not cursor["started"]
+        )
+        async_write_statistics(self._hass, statistic_id, stats)
+        cursor.update(hours=ready, sum=running, started=True)
+
+    async def _async_init_cursor(self, statistic_id, day, finishing):
+        if (last := await _async_last_statistic(self._hass, statistic_id)) is None:
+            return {"day": day.day, "sum": 0.0, "hours": 0, "started": False}
+        start, last_sum = last
+        # Część godzin już jest w recorderze (np. przed restartem) - także niedokończonej poprzedniej doby
+        days = (local_day(finishing[0]), day) if finishing is not None else (day,)
+        for local in days:
+            if local.start <= start < local.bounds[-1]:
+                return {"day": local.day, "sum": last_sum, "hours": round((start - local.start).total_seconds() / 3600), "started": True}
+        return {"day": day.day, "sum": last_sum, "hours": 0, "started": False}
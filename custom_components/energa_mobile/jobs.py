@@ -0,0 +1,200 @@
+"""Per-account manager for history import and repair jobs."""
+import asyncio
+from collections import deque
+from datetime import timedelta
+import logging
+import time
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .const import SIGNAL_JOB_PROGRESS, JOB_PROGRESS_INTERVAL
+
+_LOGGER = logging.getLogger(__name__)
+
+class HistoryJob:
+    """Jeden zakres dni [first_day, last_day] jednego licznika. Funkcja importu raportuje przez niego postęp."""
+
+    def __init__(self, manager, kind, meter_id, first_day, last_day, run):
+        self._manager = manager
+        self.kind = kind
+        self.meter_id = meter_id
+        self.first_day = first_day
+        self.last_day = last_day
+        self.days = (last_day - first_day).days + 1
+        self.days_total = self.days
+        self.days_done = 0
+        self.rows = 0
+        self._run = run
+
+    async def async_wait(self):
+        """Blokuje pętlę importu na czas pauzy jego licznika."""
+        await self._manager.resumed(self.meter_id).wait()
+
+    def set_total(self, days):
+        # Import po wznowieniu z checkpointu pobiera mniej dni niż zakres
+        self.days_total = days
+        self._manager.async_progress(force=True)
+
+    def advance(self, rows=0):
+        self.days_done += 1
+        self.rows += rows
+        self._manager.async_progress()
+
+    def as_dict(self):
+        return {
+            "kind": self.kind, "meter_point_id": self.meter_id, "first_day": self.first_day.isoformat(),
+            "last_day": self.last_day.isoformat(), "days_done": self.days_done, "days_total": self.days_total,
+        }
+
+class EnergaJobManager:
+    """Kolejka zadań per licznik: jeden naraz (wspólny łańcuch sum), zakresy bez powtórzeń, pauza i anulowanie."""
+
+    def __init__(self, hass, entry_id):
+        self._hass = hass
+        self._signal = f"{SIGNAL_JOB_PROGRESS}_{entry_id}"
+        self._pending = {}
+        self._current = {}
+        self._runners = {}
+        # Pauza per licznik; zegar pauzy (ETA) liczy czas, gdy wszystkie działające liczniki stoją
+        self._resumed = {}
+        self._paused_at = None
+        self._paused_total = 0.0
+        self._started = None
+        self._last_progress = 0.0
+        self.days_done = 0
+        self.days_total = 0
+        self.rows = 0
+
+    @property
+    def jobs(self):
+        return [*self._current.values(), *(job for queue in self._pending.values() for job in queue)]
+
+    @property
+    def status(self):
+        if not self._runners: return "idle"
+        return "paused" if self._all_paused() else "running"
+
+    def resumed(self, meter_id):
+        if (event := self._resumed.get(meter_id)) is None:
+            event = self._resumed[meter_id] = asyncio.Event()
+            event.set()
+        return event
+
+    def _all_paused(self):
+        return bool(self._runners) and all(not self.resumed(meter_id).is_set() for meter_id in self._runners)
+
+    def _meters(self, meter_id):
+        """Liczniki, których dotyczy sterowanie: wskazany (porównanie po str - serwis podaje tekst) albo wszystkie."""
+        if meter_id is None: return list(self._runners)
+        return [m for m in self._runners if str(m) == str(meter_id)]
+
+    def _update_pause_clock(self):
+        if self._all_paused():
+            if self._paused_at is None: self._paused_at = time.monotonic()
+        elif self._paused_at is not None:
+            self._paused_total += time.monotonic() - self._paused_at
+            self._paused_at = None
+
+    @callback
+    def async_submit(self, kind, meter_id, first_day, last_day, run):
+        """Dodaje zakres do kolejki licznika. Dni już objęte innym zadaniem są pomijane; zwraca nowe zadania."""
+        ranges = [(first_day, last_day)]
+        for job in [self._current.get(meter_id), *self._pending.get(meter_id, ())]:
+            if job is None: continue
+            ranges = [part for r in ranges for part in _subtract(r, (job.first_day, job.last_day))]
+        if not ranges:
+            _LOGGER.warning(f"Energa [{meter_id}]: {first_day}..{last_day} jest już w kolejce - pomijam.")
+            return []
+        if ranges != [(first_day, last_day)]:
+            _LOGGER.info(f"Energa [{meter_id}]: część zakresu jest już w kolejce, dodaję {', '.join(f'{a}..{b}' for a, b in ranges)}.")
+
+        if not self._runners: self._reset_progress()
+        jobs = [HistoryJob(self, kind, meter_id, a, b, run) for a, b in ranges]
+        self._pending.setdefault(meter_id, deque()).extend(jobs)
+        self.days_total += sum(job.days for job in jobs)
+        if meter_id not in self._runners:
+            self._runners[meter_id] = self._hass.async_create_background_task(
+                self._async_run_meter(meter_id), name=f"energa_mobile history {meter_id}"
+            )
+        self.async_progress(force=True)
+        return jobs
+
+    async def _async_run_meter(self, meter_id):
+        queue = self._pending[meter_id]
+        try:
+            while queue:
+                job = self._current[meter_id] = queue.popleft()
+                try: await job._run(job)
+                except Exception as err: _LOGGER.error(f"Energa [{meter_id}]: zadanie {job.kind} przerwane: {err}")
+                finally:
+                    self._current.pop(meter_id, None)
+                    # Dni pominięte (checkpoint, brak dziur) też liczą się jako zrobione
+                    self.days_done += job.days
+                    self.rows += job.rows
+        finally:
+            self._pending.pop(meter_id, None)
+            self._runners.pop(meter_id, None)
+            self.resumed(meter_id).set()
+            self._update_pause_clock()
+            self.async_progress(force=True)
+
+    @callback
+    def async_pause(self, meter_id=None):
+        for meter in self._meters(meter_id): self.resumed(meter).clear()
+        self._update_pause_clock()
+        self.async_progress(force=True)
+
+    @callback
+    def async_resume(self, meter_id=None):
+        for meter in self._meters(meter_id): self.resumed(meter).set()
+        self._update_pause_clock()
+        self.async_progress(force=True)
+
+    @callback
+    def async_cancel(self, meter_id=None):
+        for meter in self._meters(meter_id):
+            self._pending[meter].clear()
+            self._runners[meter].cancel()
+            self.resumed(meter).set()
+
+    @property
+    def progress(self):
+        """Postęp wszystkich zadań konta: dni, wiersze i ETA liczone z czasu bez pauz."""
+        running = self._current.values()
+        done = self.days_done + sum(job.days - job.days_total + job.days_done for job in running)
+        eta = None
+        if self._started is not None and 0 < done < self.days_total:
+            paused = self._paused_total + (time.monotonic() - self._paused_at if self._paused_at else 0.0)
+            active = time.monotonic() - self._started - paused
+            eta = timedelta(seconds=round(active / done * (self.days_total - done)))
+        return {
+            "status": self.status, "days_done": done, "days_total": self.days_total,
+            "rows": self.rows + sum(job.rows for job in running), "eta": eta,
+        }
+
+    @callback
+    def async_progress(self, force=False):
+        # Sensor postępu odświeżamy co JOB_PROGRESS_INTERVAL s, a nie po każdym dniu
+        now = time.monotonic()
+        if not force and now - self._last_progress < JOB_PROGRESS_INTERVAL: return
+        self._last_progress = now
+        async_dispatcher_send(self._hass, self._signal)
+
+    @property
+    def signal(self):
+        return self._signal
+
+    def _reset_progress(self):
+        self._started = time.monotonic()
+        self._paused_total = 0.0
+        self.days_done = self.days_total = self.rows = 0
+
+def _subtract(r, other):
+    """Zakres dni r bez dni z `other` (0, 1 albo 2 kawałki)."""
+    (a, b), (c, d) = r, other
+    if d < a or c > b: return [r]
+    parts = []
+    if a < c: parts.append((a, c - timedelta(days=1)))
+    if d < b: parts.append((d + timedelta(days=1), b))
+    return parts
@@ -0,0 +1,65 @@
+"""Adaptive rate limiter shared by all Energa API traffic of one account."""
+import asyncio
+import logging
+import time
+
+from .const import (
+    RATE_LIMIT_INITIAL, RATE_LIMIT_MIN, RATE_LIMIT_MAX, RATE_LIMIT_BURST,
+    RATE_LIMIT_INCREASE, RATE_LIMIT_LATENCY_TARGET,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+_LIMITERS = {}
+
+def get_rate_limiter(username):
+    """Jeden limiter na konto - wspólny dla koordynatora, serwisów i options flow."""
+    key = (username or "").lower()
+    if key not in _LIMITERS: _LIMITERS[key] = EnergaRateLimiter()
+    return _LIMITERS[key]
+
+class EnergaRateLimiter:
+    """Token bucket z adaptacją AIMD.
+
+    429/5xx, błędy połączenia i rosnące opóźnienie zmniejszają tempo o połowę,
+    każda zdrowa odpowiedź podnosi je o RATE_LIMIT_INCREASE zapytań/s.
+    """
+
+    def __init__(self, rate=RATE_LIMIT_INITIAL, min_rate=RATE_LIMIT_MIN, max_rate=RATE_LIMIT_MAX, burst=RATE_LIMIT_BURST):
+        self.rate = rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._latency = None
+        self._last_backoff = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def on_response(self, status, latency):
+        # EWMA opóźnienia - pojedynczy wolny request nie hamuje całego konta
+        self._latency = latency if self._latency is None else 0.8 * self._latency + 0.2 * latency
+        if status == 429 or status >= 500: self._backoff(f"HTTP {status}")
+        elif self._latency > RATE_LIMIT_LATENCY_TARGET: self._backoff(f"latency {self._latency:.2f}s")
+        else: self.rate = min(self._max_rate, self.rate + RATE_LIMIT_INCREASE)
+
+    def on_error(self):
+        self._backoff("connection error")
+
+    def _backoff(self, reason):
+        now = time.monotonic()
+        # Seria równoległych błędów liczy się jako jeden sygnał
+        if now - self._last_backoff < 1.0: return
+        self._last_backoff = now
+        self.rate = max(self._min_rate, self.rate / 2)
+        self._tokens = min(self._tokens, 0.0)
+        _LOGGER.debug(f"Energa limiter: {reason}, tempo {self.rate:.2f} req/s")
@@ -0,0 +1,85 @@
+"""Request metrics for the Energa API client."""
+from .const import LOGIN_ENDPOINT, SESSION_ENDPOINT, DATA_ENDPOINT, CHART_ENDPOINT, METRICS_LATENCY_BUCKETS
+
+ENDPOINT_NAMES = {
+    LOGIN_ENDPOINT: "login",
+    SESSION_ENDPOINT: "session",
+    DATA_ENDPOINT: "user_data",
+    CHART_ENDPOINT: "mchart",
+}
+
+class EndpointMetrics:
+    """Liczniki i histogram opóźnień jednego endpointu."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * (len(METRICS_LATENCY_BUCKETS) + 1)
+
+    def record(self, latency, error):
+        self.requests += 1
+        if error: self.errors += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.buckets[next((i for i, b in enumerate(METRICS_LATENCY_BUCKETS) if latency <= b), -1)] += 1
+
+    def as_dict(self):
+        labels = [f"<={b}s" for b in METRICS_LATENCY_BUCKETS] + [f">{METRICS_LATENCY_BUCKETS[-1]}s"]
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_avg": round(self.latency_sum / self.requests, 3) if self.requests else None,
+            "latency_max": round(self.latency_max, 3),
+            "latency_histogram": dict(zip(labels, self.buckets)),
+        }
+
+class EnergaMetrics:
+    """Metryki zapytań jednego konta: per endpoint, ponowne logowania, cache, single-flight i tryb zakresowy."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self.relogins = 0
+        self.coalesced = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.range_skipped = 0
+        self.range_mismatches = 0
+
+    def record(self, path, latency, error=False):
+        name = ENDPOINT_NAMES.get(path, path)
+        if name not in self.endpoints: self.endpoints[name] = EndpointMetrics()
+        self.endpoints[name].record(latency, error)
+
+    @property
+    def requests(self):
+        return sum(e.requests for e in self.endpoints.values())
+
+    @property
+    def errors(self):
+        return sum(e.errors for e in self.endpoints.values())
+
+    @property
+    def latency_avg(self):
+        requests = self.requests
+        return sum(e.latency_sum for e in self.endpoints.values()) / requests if requests else None
+
+    @property
+    def cache_hit_rate(self):
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total else None
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "relogins": self.relogins,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": round(self.cache_hit_rate, 3) if self.cache_hit_rate is not None else None,
+            "range_skipped": self.range_skipped,
+            "range_mismatches": self.range_mismatches,
+            "endpoints": {name: e.as_dict() for name, e in self.endpoints.items()},
+        }
@@ -0,0 +1,55 @@
+"""Publication-aware polling schedule for the Energa coordinator."""
+from collections import deque
+import logging
+from statistics import median
+
+from .const import POLL_BASE_INTERVAL, POLL_DENSE_INTERVAL, POLL_MAX_INTERVAL, POLL_WINDOW, POLL_HISTORY
+
+_LOGGER = logging.getLogger(__name__)
+
+class EnergaPollScheduler:
+    """Uczy się, co ile Energa publikuje nowe dane dla każdego licznika.
+
+    Wokół spodziewanej publikacji (± POLL_WINDOW) odpytujemy co POLL_DENSE_INTERVAL,
+    poza oknem czekamy do jego początku (max POLL_MAX_INTERVAL).
+    """
+
+    def __init__(self):
+        self._signatures = {}
+        self._last_change = {}
+        self._periods = {}
+
+    @staticmethod
+    def signature(meter):
+        return hash((
+            meter.get("daily_pobor"), meter.get("daily_produkcja"),
+            meter.get("total_plus"), meter.get("total_minus"), meter.get("chart_hours"),
+        ))
+
+    def observe(self, meters, now):
+        """Zapisuje moment zmiany danych; zwraca zbiór liczników z nowymi danymi."""
+        changed = set()
+        for meter_id, meter in meters.items():
+            sig = self.signature(meter)
+            if self._signatures.get(meter_id) == sig: continue
+            if meter_id in self._signatures:
+                if (last := self._last_change.get(meter_id)) is not None:
+                    self._periods.setdefault(meter_id, deque(maxlen=POLL_HISTORY)).append(now - last)
+                self._last_change[meter_id] = now
+            self._signatures[meter_id] = sig
+            changed.add(meter_id)
+        return changed
+
+    def next_interval(self, now):
+        expected = [
+            self._last_change[mid] + median(periods)
+            for mid, periods in self._periods.items() if periods and mid in self._last_change
+        ]
+        if not expected: return POLL_BASE_INTERVAL
+
+        # Spóźniona publikacja (poza oknem) - nie odpytujemy gęsto w nieskończoność
+        upcoming = [t for t in expected if t + POLL_WINDOW > now]
+        if not upcoming: return POLL_BASE_INTERVAL
+        window_start = min(upcoming) - POLL_WINDOW
+        if now >= window_start: return POLL_DENSE_INTERVAL
+        return max(POLL_DENSE_INTERVAL, min(POLL_MAX_INTERVAL, window_start - now))
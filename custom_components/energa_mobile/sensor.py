@@ -2,42 +2,83 @@
 from datetime import timedelta
 import logging
 import asyncio # <--- DODANY IMPORT ASYNCIO
+import aiohttp
 from homeassistant.components.sensor import (
     SensorEntity,
     SensorDeviceClass,
     SensorStateClass,
 )
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import UnitOfEnergy, EntityCategory
-from homeassistant.core import HomeAssistant
+from homeassistant.const import UnitOfEnergy, UnitOfTime, EntityCategory, PERCENTAGE
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
     DataUpdateCoordinator,
     UpdateFailed,
 )
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.importlib import async_import_module
+from homeassistant.exceptions import ConfigEntryAuthFailed
 from homeassistant.helpers.restore_state import RestoreEntity
+from homeassistant.util import dt as dt_util
+from .aggregates import PERIODS, period_start
 from .api import EnergaAuthError, EnergaConnectionError, EnergaTokenExpiredError
-from .const import DOMAIN
+from .const import DOMAIN, CONF_USERNAME, CONF_EXTERNAL_STATISTICS, CONF_PRICE_PEAK, DATA_JOBS, POLL_BASE_INTERVAL
+from .day_calendar import local_day, today
+from .scheduler import EnergaPollScheduler
 
 _LOGGER = logging.getLogger(__name__)
 
+# Sensory metryk API odpytywane lokalnie (bez zapytań do Energi)
+SCAN_INTERVAL = timedelta(minutes=1)
+
+# Mapowanie dla czystych sensorów total_increasing na total_plus/minus
+LIVE_MAP = {
+    "import_total": "total_plus",
+    "export_total": "total_minus",
+}
+
+# Diagnostyka API konta: (key, name, unit, state_class, icon, wartość z EnergaMetrics)
+API_METRIC_SENSORS = [
+    ("requests", "API – zapytania", None, SensorStateClass.TOTAL_INCREASING, "mdi:counter", lambda m: m.requests),
+    ("errors", "API – błędy", None, SensorStateClass.TOTAL_INCREASING, "mdi:alert-circle-outline", lambda m: m.errors),
+    ("relogins", "API – ponowne logowania", None, SensorStateClass.TOTAL_INCREASING, "mdi:login", lambda m: m.relogins),
+    ("latency", "API – średnie opóźnienie", UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, "mdi:timer-outline",
+     lambda m: round(m.latency_avg * 1000) if m.latency_avg is not None else None),
+    ("cache_hit_rate", "Cache wykresów – trafienia", PERCENTAGE, SensorStateClass.MEASUREMENT, "mdi:database-check",
+     lambda m: round(m.cache_hit_rate * 100, 1) if m.cache_hit_rate is not None else None),
+]
+
+# Agregaty z wektorów godzinowych: (rejestr, okres) -> nazwa; ikona per rejestr, liczba kubełków w atrybutach per okres
+AGGREGATE_NAMES = {"import": "Pobór", "export": "Produkcja"}
+PERIOD_NAMES = {"hour": "ostatnia godzina", "day": "dziś", "week": "ten tydzień", "month": "ten miesiąc"}
+AGGREGATE_ICONS = {"import": "mdi:transmission-tower-import", "export": "mdi:solar-power-variant"}
+PERIOD_HISTORY = {"hour": 24, "day": 14, "week": 8, "month": 12}
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities: AddEntitiesCallback):
     api = hass.data[DOMAIN][entry.entry_id]
 
-    coordinator = EnergaDataCoordinator(hass, api)
-    try:
-        await coordinator.async_config_entry_first_refresh()
-    except Exception:
-        _LOGGER.warning("Energa: Start bez pełnych danych API")
+    coordinator = EnergaDataCoordinator(hass, api, entry.options.get(CONF_EXTERNAL_STATISTICS, False), entry.options)
+    entry.async_on_unload(coordinator.async_unload)
+    if api._meters_data:
+        # Liczniki z pamięci lokalnej: encje od razu, pierwsze odświeżenie w tle (start HA nie czeka na API)
+        coordinator.data = {m["meter_point_id"]: m for m in api._meters_data}
+        entry.async_create_background_task(hass, coordinator.async_refresh(), "energa_mobile first refresh")
+    else:
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except Exception:
+            _LOGGER.warning("Energa: Start bez pełnych danych API")
 
-    entities = []
-    meters = coordinator.data or []
-    if not meters:
-        return
+    # Diagnostyka API konta - niezależna od tego, czy liczniki już są
+    entities = [EnergaApiMetricSensor(api, entry, *desc) for desc in API_METRIC_SENSORS]
+    entities.append(EnergaJobProgressSensor(hass.data[DATA_JOBS][entry.entry_id], entry))
+    meters = coordinator.data or {}
 
-    for meter in meters:
+    for meter in meters.values():
         meter_id = meter["meter_point_id"]
 
         sensors = [
@@ -69,52 +110,137 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
                 )
             )
 
+        # Agregaty tylko dla rejestrów, które licznik ma
+        for kind, obis_key in (("import", "obis_plus"), ("export", "obis_minus")):
+            if not meter.get(obis_key): continue
+            entities.extend(EnergaAggregateSensor(coordinator, api.aggregates, meter_id, kind, period) for period in PERIODS)
+
     async_add_entities(entities)
 
 class EnergaDataCoordinator(DataUpdateCoordinator):
     """Live API polling."""
 
-    def __init__(self, hass, api):
+    def __init__(self, hass, api, external=False, options=None):
         super().__init__(
             hass,
             _LOGGER,
             name="Energa Mobile Live API",
-            update_interval=timedelta(hours=1),
+            update_interval=POLL_BASE_INTERVAL,
+            always_update=False,
         )
         self.api = api
         self._errors = 0
+        self._scheduler = EnergaPollScheduler()
+        self._external = external
+        self._options = options or {}
+        # Feed live pisze tylko statystyki zewnętrzne: energię (tryb external) i koszty (ustawione ceny)
+        self._feed_enabled = external or self._options.get(CONF_PRICE_PEAK) is not None
+        self.feed = None
+        self.changed_meters = set()
+        # Poprzednia doba do dokończenia (godziny publikowane po północy): meter_id -> dzień
+        self._day = None
+        self._finishing = {}
+
+    async def _async_get_feed(self):
+        # Moduł historii (statystyki recordera) ładujemy dopiero przy pierwszych nowych godzinach
+        if self.feed is None:
+            history = await async_import_module(self.hass, f"{__package__}.history")
+            self.feed = history.LiveStatisticsFeed(self.hass, self._external, self._options)
+        return self.feed
+
+    @callback
+    def async_unload(self):
+        if self.feed is not None: self.feed.async_unload()
+
+    async def _async_finish_previous_day(self, data, now):
+        """Po północy (i przy starcie) pobiera wczorajszy wektor, aż będzie pełny - agregaty i feed dostają resztę doby.
+
+        Zwraca {meter_id: (dzień, dane)} dla liczników, których wczorajszy wektor pobrano w tym odświeżeniu.
+        """
+        day = today()
+        if self._day != day:
+            self._day = day
+            self._finishing = {meter_id: day - timedelta(days=1) for meter_id in data}
+        finished = {}
+        for meter_id, prev_day in list(self._finishing.items()):
+            meter = data.get(meter_id)
+            # Dzień starszy niż wczoraj jest już zamknięty - ewentualne braki uzupełni repair_history
+            if meter is None or prev_day < day - timedelta(days=1):
+                self._finishing.pop(meter_id)
+                continue
+            # Błąd (także 429/5xx z raise_for_status) nie psuje odświeżenia - licznik zostaje w kolejce do kolejnej próby
+            try: prev = await self.api.async_get_history_hourly(meter_id, prev_day)
+            except (EnergaConnectionError, asyncio.TimeoutError, EnergaTokenExpiredError, aiohttp.ClientError) as err:
+                _LOGGER.debug(f"Energa [{meter_id}]: wczorajsze dane niedostępne: {err}")
+                continue
+            finished[meter_id] = (prev_day, prev)
+            local = local_day(prev_day)
+            kinds = [kind for kind, obis_key in (("import", "obis_plus"), ("export", "obis_minus")) if meter.get(obis_key)]
+            # Ostatnia godzina doby ma wiersz o północy - gotowa do zapisu dopiero godzinę później
+            if all(len(prev[kind]) >= local.hours for kind in kinds) and now >= local.bounds[-1] + timedelta(hours=1):
+                self._finishing.pop(meter_id)
+        return finished
+
+    def _fill_period_days(self, data):
+        """Zamknięte dni bieżącego tygodnia i miesiąca, których agregaty nie widziały - wyłącznie z cache wykresów.
+
+        Bez zapytań do API: dni spoza cache (przerwa w działaniu HA, świeża instalacja) zostają brakami,
+        a sensory tygodnia i miesiąca pokazują je jako complete: false. Wczoraj dokańcza _async_finish_previous_day.
+        """
+        aggregates = self.api.aggregates
+        day = today()
+        first = min(period_start("week", day), period_start("month", day))
+        filled = 0
+        for meter_id, meter in data.items():
+            for kind, obis_key in (("import", "obis_plus"), ("export", "obis_minus")):
+                if not (obis := meter.get(obis_key)): continue
+                for missing_day in aggregates.missing_days(meter_id, kind, first, day - timedelta(days=2)):
+                    if (vals := self.api.cached_day(meter_id, obis, missing_day)) is None: continue
+                    aggregates.observe(meter_id, kind, missing_day, vals)
+                    filled += 1
+        if filled: _LOGGER.debug(f"Energa: agregaty tygodnia i miesiąca uzupełnione z cache o {filled} dni.")
+        return filled
 
     async def _async_update_data(self):
+        self.changed_meters = set()
         try:
-            data = await self.api.async_get_data()
+            meters = await self.api.async_get_data()
+            # Indeks po meter_point_id + zbiór liczników, których wartości się zmieniły (po hashu)
+            data = {m["meter_point_id"]: m for m in meters}
+            now = dt_util.utcnow()
+            self.changed_meters = self._scheduler.observe(data, now)
+            finished = await self._async_finish_previous_day(data, now)
+            self.changed_meters |= finished.keys()
+            # Cache wykresów wczytuje się w tle - brakujące dni sprawdzamy przy każdym odświeżeniu
+            if self._fill_period_days(data) and self.data is not None: self.async_update_listeners()
+            # Nic nowego - zwracamy te same dane, always_update=False pomija listenery
+            if self.data is not None and not self.changed_meters and data.keys() == self.data.keys():
+                data = self.data
+
+            # Nowe godziny z dzisiejszego wykresu (i reszta wczorajszego) od razu trafiają do statystyk
+            if self._feed_enabled and self.changed_meters:
+                feed = await self._async_get_feed()
+                for meter_id in self.changed_meters:
+                    await feed.async_update(data[meter_id], finished.get(meter_id))
 
             if self._errors > 0:
                 _LOGGER.info("Energa API: przywrócono połączenie")
                 self._errors = 0
-                self.update_interval = timedelta(hours=1)
 
+            self.update_interval = self._scheduler.next_interval(now)
             return data
 
-        # DODANO EnergaTokenExpiredError do obsługi 401/403 z API
-        except (EnergaConnectionError, asyncio.TimeoutError, EnergaTokenExpiredError) as err:
+        # EnergaAPI sam loguje się ponownie przy 401/403 - tu trafia tylko błąd po nieudanym powtórzeniu
+        except (EnergaConnectionError, asyncio.TimeoutError, EnergaTokenExpiredError, aiohttp.ClientError) as err:
             self._errors += 1
             delay = 15 if self._errors > 2 else (5 if self._errors > 1 else 2)
             self.update_interval = timedelta(minutes=delay)
-
-            # Jeśli to problem z tokenem (401/403), spróbujemy się ponownie zalogować
-            if isinstance(err, EnergaTokenExpiredError):
-                _LOGGER.warning("Energa Token wygasł. Spróbuję ponownego logowania.")
-                try:
-                    await self.api.async_login()
-                except Exception:
-                    pass # Jeśli logowanie padnie, rzucimy UpdateFailed
-
-            # Jeśli login się nie powiódł, rzucamy UpdateFailed i Coordinator będzie retryował
             raise UpdateFailed(f"API ERROR: {err}") from err
 
+        # Hasło nieaktualne (także gdy logowanie odłożono przy starcie z pamięci) - HA uruchamia reauth
         except EnergaAuthError as err:
-            self.update_interval = timedelta(hours=1)
-            raise UpdateFailed(f"Błąd autoryzacji Energa: {err}") from err
+            self.update_interval = POLL_BASE_INTERVAL
+            raise ConfigEntryAuthFailed(f"Błąd autoryzacji Energa: {err}") from err
 
 class EnergaSensor(CoordinatorEntity, SensorEntity, RestoreEntity):
     # ... (klasa EnergaSensor pozostaje bez zmian, używając RestoreEntity) ...
@@ -138,6 +264,8 @@ class EnergaSensor(CoordinatorEntity, SensorEntity, RestoreEntity):
         self._attr_state_class = state_class
         self._attr_icon = icon
         self._restored_value = None
+        self._source_key = LIVE_MAP.get(key, key)
+        self._last_available = None
 
         self._attr_unique_id = f"energa_{key}_{meter_id}"
 
@@ -152,29 +280,25 @@ class EnergaSensor(CoordinatorEntity, SensorEntity, RestoreEntity):
             except ValueError:
                 self._restored_value = None
 
+    @callback
+    def _handle_coordinator_update(self):
+        """Zapisujemy stan tylko gdy dane licznika albo dostępność się zmieniły."""
+        available = self.available
+        if self._meter_id not in self.coordinator.changed_meters and available == self._last_available:
+            return
+        self._last_available = available
+        self.async_write_ha_state()
+
     @property
     def native_value(self):
         """Return sensor state from live API or restored state."""
 
-        data = self.coordinator.data
-        if data:
-            meter = next(
-                (m for m in data if m["meter_point_id"] == self._meter_id),
-                None,
-            )
-            if meter:
-                # Mapowanie dla czystych sensorów total_increasing na total_plus/minus
-                live_map = {
-                    "import_total": "total_plus",
-                    "export_total": "total_minus",
-                }
-
-                key_to_fetch = live_map.get(self._data_key, self._data_key)
-
-                value = meter.get(key_to_fetch)
-                if isinstance(value, (int, float)):
-                    self._restored_value = float(value)
-                    return self._restored_value
+        meter = (self.coordinator.data or {}).get(self._meter_id)
+        if meter:
+            value = meter.get(self._source_key)
+            if isinstance(value, (int, float)):
+                self._restored_value = float(value)
+                return self._restored_value
 
         if self._restored_value is not None:
             return self._restored_value
@@ -183,13 +307,7 @@ class EnergaSensor(CoordinatorEntity, SensorEntity, RestoreEntity):
 
     @property
     def device_info(self) -> DeviceInfo:
-        meter = (
-            next(
-                (m for m in self.coordinator.data if m["meter_point_id"] == self._meter_id),
-                None,
-            )
-            or {}
-        )
+        meter = (self.coordinator.data or {}).get(self._meter_id) or {}
 
         return DeviceInfo(
             identifiers={(DOMAIN, str(self._meter_id))},
@@ -199,3 +317,108 @@ class EnergaSensor(CoordinatorEntity, SensorEntity, RestoreEntity):
             configuration_url="https://mojlicznik.energa-operator.pl",
             sw_version="3.5.6",
         )
+
+class EnergaAggregateSensor(CoordinatorEntity, SensorEntity):
+    """Suma godziny / dnia / tygodnia / miesiąca z agregatów EnergaAPI - bez własnych zapytań."""
+
+    _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+    _attr_device_class = SensorDeviceClass.ENERGY
+
+    def __init__(self, coordinator, aggregates, meter_id, kind, period):
+        super().__init__(coordinator)
+        self._aggregates = aggregates
+        self._meter_id = meter_id
+        self._kind = kind
+        self._period = period
+        self._attr_name = f"Energa {AGGREGATE_NAMES[kind]} – {PERIOD_NAMES[period]}"
+        self._attr_icon = AGGREGATE_ICONS[kind]
+        self._attr_unique_id = f"energa_{kind}_{period}_{meter_id}"
+        # Każdy okres rośnie od swojego początku (last_reset) - dla godziny to start ostatniej opublikowanej godziny
+        self._attr_state_class = SensorStateClass.TOTAL
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, str(meter_id))})
+
+    @property
+    def native_value(self):
+        value = self._aggregates.value(self._meter_id, self._kind, self._period)
+        return round(value, 3) if value is not None else None
+
+    @property
+    def last_reset(self):
+        if self._period == "hour": return self._aggregates.last_hour_start(self._meter_id, self._kind)
+        return local_day(period_start(self._period, today())).start
+
+    @property
+    def extra_state_attributes(self):
+        attrs = {"history": self._aggregates.history(self._meter_id, self._kind, self._period, PERIOD_HISTORY[self._period])}
+        if self._period in ("week", "month"): attrs["complete"] = self._aggregates.complete(self._meter_id, self._kind, self._period)
+        return attrs
+
+class EnergaApiMetricSensor(SensorEntity):
+    """Metryki zapytań EnergaAPI (liczniki, opóźnienia, cache) jako encje diagnostyczne konta."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = True
+
+    def __init__(self, api, entry, key, name, unit, state_class, icon, value_fn):
+        self._api = api
+        self._value_fn = value_fn
+        self._attr_name = name
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+        self._attr_icon = icon
+        self._attr_unique_id = f"energa_api_{key}_{entry.entry_id}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, entry.entry_id)},
+            name=f"Energa API {entry.data.get(CONF_USERNAME, '')}",
+            manufacturer="Energa-Operator",
+            entry_type=DeviceEntryType.SERVICE,
+        )
+        self._is_requests = key == "requests"
+
+    @property
+    def native_value(self):
+        return self._value_fn(self._api.metrics)
+
+    @property
+    def extra_state_attributes(self):
+        # Rozbicie per endpoint tylko na sensorze zapytań
+        if self._is_requests: return self._api.metrics.as_dict()["endpoints"]
+        return None
+
+class EnergaJobProgressSensor(SensorEntity):
+    """Postęp zadań importu/naprawy historii konta: % dni, wiersze i ETA w atrybutach."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_should_poll = False
+    _attr_name = "Import historii – postęp"
+    _attr_icon = "mdi:progress-download"
+    _attr_native_unit_of_measurement = PERCENTAGE
+
+    def __init__(self, manager, entry):
+        self._manager = manager
+        self._attr_unique_id = f"energa_history_progress_{entry.entry_id}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, entry.entry_id)},
+            name=f"Energa API {entry.data.get(CONF_USERNAME, '')}",
+            manufacturer="Energa-Operator",
+            entry_type=DeviceEntryType.SERVICE,
+        )
+
+    async def async_added_to_hass(self):
+        self.async_on_remove(async_dispatcher_connect(self.hass, self._manager.signal, self.async_write_ha_state))
+
+    @property
+    def native_value(self):
+        progress = self._manager.progress
+        if not progress["days_total"]: return None
+        return round(100 * progress["days_done"] / progress["days_total"], 1)
+
+    @property
+    def extra_state_attributes(self):
+        progress = self._manager.progress
+        eta = progress["eta"]
+        return {
+            **progress,
+            "eta": str(eta) if eta is not None else None,
+            "jobs": [job.as_dict() for job in self._manager.jobs],
+        }
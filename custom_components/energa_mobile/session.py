@@ -0,0 +1,37 @@
+"""Shared HTTP connection pool for Energa Mobile accounts."""
+import logging
+
+import aiohttp
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+
+from .const import (
+    DATA_CONNECTOR, HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, HTTP_KEEPALIVE, HTTP_DNS_CACHE_TTL,
+    HTTP_TIMEOUT_TOTAL, HTTP_TIMEOUT_CONNECT, HTTP_TIMEOUT_READ,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+def _async_get_connector(hass):
+    """Jeden connector na domenę - limit połączeń do hosta Energi obejmuje wszystkie konta."""
+    connector = hass.data.get(DATA_CONNECTOR)
+    if connector is not None and not connector.closed: return connector
+
+    # Weryfikacja certyfikatu wyłączona jak dotąd (wcześniej ssl=False w każdym zapytaniu)
+    connector = hass.data[DATA_CONNECTOR] = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT, limit_per_host=HTTP_POOL_LIMIT_PER_HOST, keepalive_timeout=HTTP_KEEPALIVE,
+        use_dns_cache=True, ttl_dns_cache=HTTP_DNS_CACHE_TTL, ssl=False,
+    )
+
+    async def _async_close(event):
+        await connector.close()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, _async_close)
+    return connector
+
+def async_create_session(hass):
+    """Osobna sesja konta (własne ciasteczka) na wspólnym connectorze. Zamyka ją wołający."""
+    return aiohttp.ClientSession(
+        connector=_async_get_connector(hass), connector_owner=False, cookie_jar=aiohttp.CookieJar(),
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_TOTAL, connect=HTTP_TIMEOUT_CONNECT, sock_read=HTTP_TIMEOUT_READ),
+    )
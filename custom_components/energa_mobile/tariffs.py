@@ -0,0 +1,56 @@
+"""Tariff zones and hourly cost vectors for Energa tariffs (G11, G12, G12w)."""
+from array import array
+from functools import lru_cache
+import logging
+
+from .day_calendar import TZ, local_day
+from .const import (
+    CONF_TARIFF, CONF_PRICE_PEAK, CONF_PRICE_OFFPEAK, TARIFF_AUTO, TARIFF_SCHEDULES, DAY_CALENDAR_SIZE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+# Kody bez harmonogramu, o których już ostrzegliśmy (tariff_pricing woła się przy każdym odświeżeniu)
+_UNKNOWN_WARNED = set()
+
+def normalize_tariff(code):
+    """Kod taryfy z API ("G12W ", "g11") -> klucz TARIFF_SCHEDULES albo None, gdy taryfa nie ma harmonogramu stref."""
+    code = str(code or "").strip().upper()
+    for key in TARIFF_SCHEDULES:
+        if key.upper() == code: return key
+    if code not in _UNKNOWN_WARNED:
+        _UNKNOWN_WARNED.add(code)
+        _LOGGER.warning(
+            f"Energa: taryfa {code or '(brak)'} nie ma harmonogramu stref ({', '.join(TARIFF_SCHEDULES)}) - koszty wyłączone. "
+            "Wybierz taryfę ręcznie w opcjach integracji."
+        )
+    return None
+
+@lru_cache(maxsize=DAY_CALENDAR_SIZE)
+def day_zones(tariff, day):
+    """Strefa każdej godziny doby (0 = szczyt / całodobowa, 1 = poza szczytem) wg lokalnej godziny startu."""
+    schedule = TARIFF_SCHEDULES[tariff]
+    if schedule["weekend"] and day.weekday() >= 5: return (1,) * local_day(day).hours
+    zones = []
+    for start in local_day(day).bounds[:-1]:
+        hour = start.astimezone(TZ).hour
+        zones.append(int(any(a <= hour < b if a < b else (hour >= a or hour < b) for a, b in schedule["offpeak"])))
+    return tuple(zones)
+
+class TariffPricing:
+    """Ceny stref jednej taryfy; koszt liczony dla całego wektora godzin naraz."""
+
+    def __init__(self, tariff, price_peak, price_offpeak):
+        self.tariff = tariff
+        self._prices = (price_peak, price_offpeak if price_offpeak is not None else price_peak)
+
+    def day_costs(self, day, vals):
+        """Koszty godzin dnia [zł] - ujemne wartości (brak pomiaru) zostają ujemne, żeby nie dostały wiersza."""
+        prices = self._prices
+        return array('d', (v * prices[z] if v >= 0 else v for v, z in zip(vals, day_zones(self.tariff, day))))
+
+def tariff_pricing(options, meter_tariff):
+    """TariffPricing z opcji wpisu albo None, gdy ceny nie są ustawione albo taryfa jest nieznana (koszty wyłączone)."""
+    if options.get(CONF_PRICE_PEAK) is None: return None
+    code = options.get(CONF_TARIFF, TARIFF_AUTO)
+    if (tariff := normalize_tariff(meter_tariff if code == TARIFF_AUTO else code)) is None: return None
+    return TariffPricing(tariff, options[CONF_PRICE_PEAK], options.get(CONF_PRICE_OFFPEAK))
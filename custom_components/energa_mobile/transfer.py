@@ -0,0 +1,204 @@
+"""Bulk import and export of hourly history through local files (CSV / JSON lines)."""
+import asyncio
+from contextlib import aclosing
+import csv
+from datetime import datetime, timedelta
+import io
+import json
+import logging
+import os
+
+from .backfill import build_day_statistics
+from .day_calendar import TZ, day_of, local_day, today as local_today
+from .decode import json_loads
+from .history import (
+    CostChain, _async_resume_point, _checkpoint_key, async_get_checkpoints, async_shift_after_range, async_write_statistics,
+    statistic_ids,
+)
+from .const import HISTORY_CHUNK_DAYS, HISTORY_CHUNK_ROWS, TRANSFER_READ_CHUNK
+
+_LOGGER = logging.getLogger(__name__)
+# Jeden rekord = jedna godzina: start (ISO, bez strefy = czas polski) i wartości w kWh.
+# Powtórzoną godzinę jesiennej zmiany czasu bez strefy rozróżnia kolejność: drugi rekord 02:00 to godzina po cofnięciu zegara.
+FIELDS = ("meter_point_id", "start", "import", "export")
+
+def is_jsonl(path):
+    return os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson", ".json")
+
+async def async_iter_records(hass, path):
+    """Rekordy (meter_point_id, start UTC, import, export) z pliku, czytane paczkami w executorze."""
+    jsonl = is_jsonl(path)
+    fh = await hass.async_add_executor_job(open, path, "r", -1, "utf-8")
+    try:
+        header = None
+        while lines := await hass.async_add_executor_job(fh.readlines, TRANSFER_READ_CHUNK):
+            if jsonl: items = (json_loads(line) for line in lines if line.strip())
+            else:
+                rows = csv.reader(lines)
+                if header is None: header = [h.strip().lower() for h in next(rows, ())]
+                items = (dict(zip(header, row)) for row in rows if row)
+            for item in items:
+                try: yield _record(item)
+                except (KeyError, TypeError, ValueError) as err: _LOGGER.warning(f"Energa: pomijam błędny rekord {item}: {err}")
+    finally:
+        await hass.async_add_executor_job(fh.close)
+
+def _record(item):
+    start = datetime.fromisoformat(str(item["start"]))
+    if start.tzinfo is None: start = start.replace(tzinfo=TZ)
+    return str(item.get("meter_point_id") or ""), start, _value(item.get("import")), _value(item.get("export"))
+
+def _value(v):
+    return None if v is None or v == "" else float(v)
+
+async def async_file_ranges(hass, path):
+    """{meter_point_id: (pierwszy dzień, ostatni dzień)} - szybki przebieg po pliku przed zakolejkowaniem importu."""
+    ranges = {}
+    async for meter_id, start, _imp, _exp in async_iter_records(hass, path):
+        day = day_of(start)
+        first, last = ranges.get(meter_id, (day, day))
+        ranges[meter_id] = (min(first, day), max(last, day))
+    return ranges
+
+async def _async_iter_file_days(hass, path, meter_id, first_day, last_day, unassigned=False):
+    """Kolejne dni licznika z pliku jako {"import": wektor, "export": wektor} (brak godziny = None).
+
+    `unassigned` - rekordy bez meter_point_id też należą do tego licznika (konto z jednym licznikiem).
+    """
+    day = vectors = None
+    seen = set()
+    async with aclosing(async_iter_records(hass, path)) as records:
+        async for rec_meter, start, imp, exp in records:
+            if rec_meter != meter_id and (rec_meter or not unassigned): continue
+            rec_day = day_of(start)
+            if not first_day <= rec_day <= last_day: continue
+            if rec_day != day:
+                if vectors is not None:
+                    if rec_day < day:
+                        _LOGGER.warning(f"Energa [{meter_id}]: rekordy pliku nie są posortowane ({rec_day} po {day}) - pomijam.")
+                        continue
+                    yield day, vectors
+                day = rec_day
+                hours = local_day(day).hours
+                vectors = {"import": [None] * hours, "export": [None] * hours}
+                seen = set()
+            slots = local_day(day).slots
+            hour = round((start.timestamp() - slots[0]) / 3600)
+            # Czas bez strefy (tzinfo=TZ z _record) ma fold=0 - zajęta godzina w dniu 25-godzinnym to jej powtórzenie
+            if hour in seen and start.tzinfo is TZ and len(slots) == 26:
+                hour = round((start.replace(fold=1).timestamp() - slots[0]) / 3600)
+            if not 0 <= hour < len(slots) - 1: continue
+            seen.add(hour)
+            if imp is not None: vectors["import"][hour] = imp
+            if exp is not None: vectors["export"][hour] = exp
+    if vectors is not None: yield day, vectors
+
+async def run_file_import(hass, meter_id, path, first_day, last_day, external=False, job=None, unassigned=False, pricing=None):
+    """Import godzin z pliku do statystyk - ten sam łańcuch sum, checkpoint i przesunięcie nowszych wierszy co import z API."""
+    _LOGGER.info(f"Energa [{meter_id}]: Start importu z pliku {path} ({first_day}..{last_day}).")
+    ids = dict(zip(("import", "export"), statistic_ids(hass, meter_id, external)))
+    cp_key = _checkpoint_key(meter_id, external)
+    checkpoints = await async_get_checkpoints(hass)
+    end_day = min(last_day + timedelta(days=1), local_today())
+    resume = dict(zip(ids, await _async_resume_point(hass, checkpoints, cp_key, tuple(ids.values()), first_day, end_day)))
+    first = {kind: day for kind, (day, _s, _old) in resume.items()}
+    sums = {kind: s for kind, (_d, s, _old) in resume.items()}
+    old_ends = {kind: old for kind, (_d, _s, old) in resume.items()}
+    if min(first.values()) >= end_day:
+        _LOGGER.warning(f"Energa [{meter_id}]: Zakres {first_day}..{end_day - timedelta(days=1)} z pliku jest już w statystykach - nic do importu.")
+        return
+    if min(first.values()) > first_day: _LOGGER.info(f"Energa [{meter_id}]: Statystyki są już do {min(first.values()) - timedelta(days=1)}, wcześniejsze dni z pliku pomijam.")
+    if any(old is not None for old in old_ends.values()):
+        _LOGGER.info(f"Energa [{meter_id}]: Statystyki mają już nowsze dane - import zakresu z pliku i przesunięcie sum za {end_day - timedelta(days=1)}.")
+
+    chunks = {kind: [] for kind in ids}
+    chunk_days = 0
+    last_day_done = None
+    imported = set()
+    incomplete = 0
+    costs = await CostChain.async_create(hass, meter_id, pricing, first["import"], end_day)
+
+    async def _flush():
+        nonlocal chunk_days
+        for kind, rows in chunks.items():
+            if not rows: continue
+            async_write_statistics(hass, ids[kind], rows)
+            imported.add(kind)
+            chunks[kind] = []
+        if costs: costs.flush()
+        chunk_days = 0
+        if last_day_done is not None: await checkpoints.async_set(cp_key, last_day_done, sums["import"], sums["export"])
+
+    try:
+        file_days = _async_iter_file_days(hass, path, meter_id, first_day, end_day - timedelta(days=1), unassigned)
+        async with aclosing(file_days) as days_iter:
+            async for day, vectors in days_iter:
+                if job: await job.async_wait()
+                bounds = local_day(day).bounds
+                day_rows = 0
+                for kind, vals in vectors.items():
+                    if day < first[kind] or all(v is None for v in vals): continue
+                    # Niepełny dzień pomijamy - zostaje dziurą, którą uzupełni repair_history z API
+                    if None in vals:
+                        incomplete += 1
+                        continue
+                    rows, sums[kind] = build_day_statistics(bounds, sums[kind], vals)
+                    chunks[kind].extend(rows)
+                    day_rows += len(rows)
+                    if costs and kind == "import": costs.add_day(day, vals)
+                last_day_done = day
+                chunk_days += 1
+                if job: job.advance(day_rows)
+                if chunk_days >= HISTORY_CHUNK_DAYS or sum(map(len, chunks.values())) >= HISTORY_CHUNK_ROWS: await _flush()
+    except asyncio.CancelledError:
+        await _flush()
+        _LOGGER.info(f"Energa [{meter_id}]: Import z pliku anulowany po {last_day_done}.")
+        raise
+    await _flush()
+    if incomplete: _LOGGER.warning(f"Energa [{meter_id}]: {incomplete} niepełnych dni z pliku pominięto (repair_history uzupełni je z API).")
+    chains = [(ids[kind], sums[kind], old_ends[kind]) for kind in ids]
+    if costs: chains.append(costs.chain)
+    shifted = await async_shift_after_range(hass, end_day, chains)
+
+    if not external:
+        attrs = {"unit_of_measurement": "kWh", "device_class": "energy", "state_class": "total_increasing"}
+        for kind in imported:
+            if ids[kind] not in shifted: hass.states.async_set(ids[kind], sums[kind], attrs)
+    _LOGGER.info(f"Energa [{meter_id}]: Zakończono import z pliku.")
+
+async def run_file_export(hass, accounts, path, first_day, last_day):
+    """Eksport wektorów godzinowych (cache zamkniętych dni albo API) do pliku, paczkami po HISTORY_CHUNK_DAYS dni.
+
+    `accounts` to [(EnergaAPI, [meter_point_id])] - kilka kont trafia po kolei do jednego pliku.
+    """
+    last_day = min(last_day, local_today() - timedelta(days=1))
+    jsonl = is_jsonl(path)
+    fh = await hass.async_add_executor_job(open, path, "w", -1, "utf-8")
+    written = 0
+    try:
+        if not jsonl: await hass.async_add_executor_job(fh.write, ",".join(FIELDS) + "\n")
+        for api, meter_id in ((api, meter_id) for api, meter_ids in accounts for meter_id in meter_ids):
+            buf = io.StringIO()
+            writer = None if jsonl else csv.writer(buf, lineterminator="\n")
+            day, days = first_day, 0
+            while day <= last_day:
+                try: data = await api.async_get_history_hourly(meter_id, day)
+                except Exception as err: _LOGGER.error(f"Energa [{meter_id}]: eksport {day} - błąd pobierania: {err}")
+                else:
+                    cal = local_day(day)
+                    imp, exp = data.get("import", ()), data.get("export", ())
+                    for h in range(min(cal.hours, max(len(imp), len(exp)))):
+                        rec = (meter_id, cal.bounds[h].astimezone(TZ).isoformat(),
+                               imp[h] if h < len(imp) else None, exp[h] if h < len(exp) else None)
+                        if jsonl: buf.write(json.dumps(dict(zip(FIELDS, rec))) + "\n")
+                        else: writer.writerow(("" if v is None else v) for v in rec)
+                        written += 1
+                day += timedelta(days=1)
+                days += 1
+                if days % HISTORY_CHUNK_DAYS == 0 or day > last_day:
+                    await hass.async_add_executor_job(fh.write, buf.getvalue())
+                    buf.seek(0)
+                    buf.truncate()
+    finally:
+        await hass.async_add_executor_job(fh.close)
+    _LOGGER.info(f"Energa: Eksport {first_day}..{last_day} zakończony - {written} godzin w {path}.")
@@ -0,0 +1,119 @@
+"""Benchmark EnergaAPI na lokalnym mocku API (tests/mock_energa_server.py).
+
+Mierzy:
+  * czas odświeżenia `EnergaAPI.async_get_data` (pierwsze z /resources/user/data i kolejne - same wykresy),
+  * przepustowość importu historii (dni/s i wiersze/s) - ten sam potok co `run_history_import`
+    (async_iter_days + build_day_statistics), bez zapisu do recordera HA,
+w zależności od liczby liczników i dni.
+
+Uruchomienie (z katalogu repozytorium, w środowisku z zależnościami dev):
+    python tests/benchmark_energa.py --latency 0.02 --workers 4
+    python tests/benchmark_energa.py --unlimited --meters 1 5 20 --days 30 365
+    python tests/benchmark_energa.py --range-mode   # tryb zakresowy: MONTH + DAY tylko dla dni z zużyciem
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+import time
+from zoneinfo import ZoneInfo
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from custom_components.energa_mobile.api import EnergaAPI
+from custom_components.energa_mobile.backfill import async_iter_days, build_day_statistics
+from custom_components.energa_mobile.day_calendar import local_day
+from custom_components.energa_mobile.limiter import EnergaRateLimiter
+from mock_energa_server import USERNAME, PASSWORD, start_server
+
+TZ = ZoneInfo("Europe/Warsaw")
+
+def make_api(session, base_url, unlimited):
+    api = EnergaAPI(USERNAME, PASSWORD, session, base_url=base_url)
+    # Osobny limiter na scenariusz - wyniki nie zależą od kolejności uruchomienia
+    api._limiter = EnergaRateLimiter(rate=1e6, max_rate=1e6, burst=1e6) if unlimited else EnergaRateLimiter()
+    return api
+
+async def bench_refresh(session, base_url, unlimited):
+    api = make_api(session, base_url, unlimited)
+    await api.async_login()
+    t = time.perf_counter()
+    await api.async_get_data()
+    first = time.perf_counter() - t
+    t = time.perf_counter()
+    await api.async_get_data()
+    return first, time.perf_counter() - t
+
+async def bench_history(session, base_url, days, workers, unlimited, range_mode=False):
+    api = make_api(session, base_url, unlimited)
+    meters = await api.async_get_data()
+    start = datetime.now(TZ).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None) - timedelta(days=days + 1)
+    target_days = [start + timedelta(days=i) for i in range(days)]
+    totals = {"days": 0, "rows": 0, "errors": 0}
+
+    async def _one_meter(meter_id):
+        sums = [0.0, 0.0]
+        active = await api.async_find_active_days(meter_id, target_days[0].date(), target_days[-1].date()) if range_mode else None
+
+        async def _fetch(day):
+            return await api.async_get_history_hourly(meter_id, day, active)
+
+        async for day, data, err in async_iter_days(_fetch, target_days, workers):
+            if err is not None:
+                totals["errors"] += 1
+                continue
+            bounds = local_day(day.date()).bounds
+            for i, key in enumerate(("import", "export")):
+                rows, sums[i] = build_day_statistics(bounds, sums[i], data.get(key, ()))
+                totals["rows"] += len(rows)
+            totals["days"] += 1
+
+    t = time.perf_counter()
+    await asyncio.gather(*(_one_meter(m["meter_point_id"]) for m in meters))
+    return time.perf_counter() - t, totals
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark EnergaAPI na mocku")
+    parser.add_argument("--meters", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--days", type=int, nargs="+", default=[30, 365])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=float, default=3600.0, help="czas życia tokena na mocku [s]")
+    parser.add_argument("--unlimited", action="store_true", help="wyłącza limiter zapytań (mierzy sam klient)")
+    parser.add_argument("--range-mode", action="store_true", help="import historii w trybie zakresowym (MONTH + DAY)")
+    args = parser.parse_args()
+
+    print(f"--- Benchmark (latency={args.latency}s, jitter={args.jitter}s, errors={args.error_rate:.0%}, "
+          f"token_ttl={args.token_ttl}s, workers={args.workers}, limiter={'off' if args.unlimited else 'on'}, "
+          f"range_mode={'on' if args.range_mode else 'off'}) ---")
+    async with aiohttp.ClientSession() as session:
+        print("\n📡 Odświeżenie async_get_data")
+        print(f"{'liczniki':>9} {'pierwsze [s]':>13} {'kolejne [s]':>12} {'zapytania':>10}")
+        for meters in args.meters:
+            runner, base_url, app = await start_server(meters=meters, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, token_ttl=args.token_ttl)
+            try:
+                first, warm = await bench_refresh(session, base_url, args.unlimited)
+                requests = sum(v for k, v in app["stats"].items() if k not in ("errors", "unauthorized"))
+                print(f"{meters:>9} {first:>13.3f} {warm:>12.3f} {requests:>10}")
+            except Exception as e: print(f"{meters:>9}   ❌ {e!r}")
+            finally: await runner.cleanup()
+
+        print("\n📅 Import historii")
+        print(f"{'liczniki':>9} {'dni':>5} {'czas [s]':>9} {'dni/s':>8} {'wiersze/s':>10} {'błędy':>6} {'mchart':>7}")
+        for meters in args.meters:
+            for days in args.days:
+                runner, base_url, app = await start_server(meters=meters, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, token_ttl=args.token_ttl)
+                try:
+                    elapsed, totals = await bench_history(session, base_url, days, args.workers, args.unlimited, args.range_mode)
+                    print(f"{meters:>9} {days:>5} {elapsed:>9.2f} {totals['days'] / elapsed:>8.1f} "
+                          f"{totals['rows'] / elapsed:>10.0f} {totals['errors']:>6} {app['stats']['mchart']:>7}")
+                finally: await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(main())
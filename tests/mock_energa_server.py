@@ -0,0 +1,148 @@
+"""Lokalny zamiennik API Energa Mój Licznik (aiohttp) do testów i benchmarków.
+
+Obsługuje SessionStatus, UserLogin, /resources/user/data i /resources/mchart (type=DAY i MONTH).
+Opóźnienie, odsetek błędów 5xx, czas życia tokena i liczba liczników są konfigurowalne.
+
+Uruchomienie samodzielne:
+    python tests/mock_energa_server.py --meters 5 --latency 0.05 --error-rate 0.01 --token-ttl 600
+Integracja / EnergaAPI: base_url="http://127.0.0.1:8080/dp"
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+import random
+import secrets
+import time
+from zoneinfo import ZoneInfo
+
+from aiohttp import web
+
+TZ = ZoneInfo("Europe/Warsaw")
+OBIS_PLUS = "1-0:1.8.0*255"
+OBIS_MINUS = "1-0:2.8.0*255"
+USERNAME = "test@example.com"
+PASSWORD = "password"
+
+def create_app(meters=1, latency=0.0, jitter=0.0, error_rate=0.0, token_ttl=3600.0, seed=0):
+    app = web.Application()
+    app["cfg"] = {"meters": meters, "latency": latency, "jitter": jitter, "error_rate": error_rate, "token_ttl": token_ttl}
+    app["tokens"] = {}
+    app["stats"] = {"session": 0, "login": 0, "user_data": 0, "mchart": 0, "errors": 0, "unauthorized": 0}
+    app["rng"] = random.Random(seed)
+    app.router.add_get("/dp/apihelper/SessionStatus", session_status)
+    app.router.add_get("/dp/apihelper/UserLogin", user_login)
+    app.router.add_get("/dp/resources/user/data", user_data)
+    app.router.add_get("/dp/resources/mchart", mchart)
+    return app
+
+async def _simulate(request):
+    cfg = request.app["cfg"]
+    delay = cfg["latency"] + request.app["rng"].random() * cfg["jitter"]
+    if delay > 0: await asyncio.sleep(delay)
+    if cfg["error_rate"] and request.app["rng"].random() < cfg["error_rate"]:
+        request.app["stats"]["errors"] += 1
+        raise web.HTTPServiceUnavailable()
+
+def _check_token(request):
+    expires = request.app["tokens"].get(request.query.get("token"))
+    if expires is None or expires < time.monotonic():
+        request.app["stats"]["unauthorized"] += 1
+        raise web.HTTPUnauthorized()
+
+async def session_status(request):
+    request.app["stats"]["session"] += 1
+    await _simulate(request)
+    return web.json_response({"success": True})
+
+async def user_login(request):
+    request.app["stats"]["login"] += 1
+    await _simulate(request)
+    if request.query.get("username") != USERNAME or request.query.get("password") != PASSWORD:
+        return web.json_response({"success": False})
+    token = secrets.token_hex(16)
+    request.app["tokens"][token] = time.monotonic() + request.app["cfg"]["token_ttl"]
+    return web.json_response({"success": True, "token": token})
+
+def meter_id(index):
+    return 100000 + index
+
+async def user_data(request):
+    request.app["stats"]["user_data"] += 1
+    await _simulate(request)
+    _check_token(request)
+    meter_points, agreement_points = [], []
+    for i in range(request.app["cfg"]["meters"]):
+        mid = meter_id(i)
+        meter_points.append({
+            "id": mid, "dev": f"SN{mid}", "tariff": "G11",
+            "lastMeasurements": [{"zone": "A+ strefa 1", "value": 1000.0 + i}, {"zone": "A- strefa 1", "value": 500.0 + i}],
+            "meterObjects": [{"obis": OBIS_PLUS}, {"obis": OBIS_MINUS}],
+        })
+        agreement_points.append({
+            "id": mid, "code": f"PL0037{mid:012d}", "address": f"ul. Testowa {i + 1}",
+            "dealer": {"start": int(datetime(2023, 1, 1, tzinfo=TZ).timestamp() * 1000)},
+        })
+    return web.json_response({"success": True, "response": {"meterPoints": meter_points, "agreementPoints": agreement_points}})
+
+def hourly_values(mid, obis, day):
+    """Deterministyczny wektor godzinowy dla (licznik, rejestr, dzień)."""
+    rng = random.Random(f"{mid}|{obis}|{day.isoformat()}")
+    hours = day_hours(day)
+    if obis == OBIS_MINUS: return [round(max(0.0, rng.uniform(-0.5, 1.5)) if 8 <= h <= 18 else 0.0, 3) for h in range(hours)]
+    return [round(rng.uniform(0.05, 1.2), 3) for _ in range(hours)]
+
+def day_hours(day):
+    """23/24/25 - liczba godzin doby w strefie Europe/Warsaw."""
+    start = datetime(day.year, day.month, day.day, tzinfo=TZ)
+    end = datetime.fromordinal(day.toordinal() + 1).replace(tzinfo=TZ)
+    return round((end.timestamp() - start.timestamp()) / 3600)
+
+async def mchart(request):
+    request.app["stats"]["mchart"] += 1
+    await _simulate(request)
+    _check_token(request)
+    q = request.query
+    day = datetime.fromtimestamp(int(q["mainChartDate"]) / 1000, TZ).date()
+    now = datetime.now(TZ)
+    if q.get("type") == "MONTH": return web.json_response({"success": True, "response": {"mainChart": month_points(q, day, now.date())}})
+    vals = hourly_values(int(q["meterPoint"]), q["meterObject"], day)
+    # Dzisiejsze, jeszcze nieopublikowane godziny mają zones=[null]
+    published = len(vals) if day < now.date() else (now.hour if day == now.date() else 0)
+    points = [{"zones": [v if h < published else None]} for h, v in enumerate(vals)]
+    return web.json_response({"success": True, "response": {"mainChart": points}})
+
+def month_points(q, day, today):
+    """MONTH: suma dobowa dla każdego dnia miesiąca, przyszłe dni i dziś jako null."""
+    first = day.replace(day=1)
+    n_days = ((first + timedelta(days=32)).replace(day=1) - first).days
+    points = []
+    for i in range(n_days):
+        d = first + timedelta(days=i)
+        value = round(sum(hourly_values(int(q["meterPoint"]), q["meterObject"], d)), 3) if d < today else None
+        points.append({"zones": [value]})
+    return points
+
+async def start_server(host="127.0.0.1", port=0, **kwargs):
+    """Startuje serwer w bieżącej pętli; zwraca (runner, base_url, app)."""
+    app = create_app(**kwargs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}/dp", app
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock API Energa Mój Licznik")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--meters", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=float, default=3600.0)
+    args = parser.parse_args()
+    print(f"Mock Energa: http://127.0.0.1:{args.port}/dp (login: {USERNAME} / {PASSWORD})")
+    web.run_app(create_app(args.meters, args.latency, args.jitter, args.error_rate, args.token_ttl), port=args.port)
+
+if __name__ == "__main__":
+    main()